@@ -0,0 +1,234 @@
+"""vectorised Monte Carlo battle simulator used to check recommended teams
+
+The model is a simplified level 50 single battle. Each side sends out its pokemon in team order and the
+active pokemon trade hits until one faints, then the next one of that side comes in with the damage already
+taken carried over. The side left with pokemon wins. Each turn:
+    - the faster pokemon attacks first (speed ties are a coin flip) and a fainted pokemon does not attack
+    - every attack is an 80 power move of the attacker's type (STAB) that is most effective against the
+      defender, using the better of physical (Attack / Defense) and special (Sp. Attack / Sp. Defense) stats
+    - damage follows the main series formula with the type multiplier from the chart, a random factor
+      between 0.85 and 1 and a 1 in 24 critical hit chance for 1.5x damage
+
+Battles are simulated in NumPy batches, one array slot per battle, and batches are spread over a process pool.
+"""
+from __future__ import annotations
+
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+
+from graph_algorithm import graph_builder, get_effectiveness
+from pokedex import Pokedex
+
+LEVEL = 50
+MOVE_POWER = 80
+STAB = 1.5
+CRIT_CHANCE = 1 / 24
+CRIT_MULTIPLIER = 1.5
+MAX_TURNS = 200
+# z value of a two sided 95% confidence interval
+Z_95 = 1.959963984540054
+
+
+def battle_stats(row: list) -> list[int]:
+    """return the level 50 (HP, Attack, Defense, Sp. Attack, Sp. Defense, Speed) of a processed row
+
+    Every stat uses perfect IVs and no EVs.
+    """
+    base_hp, *base_stats = row[4:10]
+    hp = (2 * base_hp + 31) * LEVEL // 100 + LEVEL + 10
+    return [hp] + [(2 * base + 31) * LEVEL // 100 + 5 for base in base_stats]
+
+
+def _typing(row: list) -> Any:
+    """return the typing of a row the way graph_algorithm expects it"""
+    return (row[2], row[3]) if row[3] else row[2]
+
+
+def _attacking_types(row: list) -> tuple:
+    """return the types of the moves of a row"""
+    return (row[2], row[3]) if row[3] else (row[2],)
+
+
+class BattleSetup:
+    """
+    The precomputed arrays of one user team against one enemy team.
+
+    Instance Attributes:
+        - user_names: the names of the user team, in battle order
+        - enemy_names: the names of the enemy team, in battle order
+        - user_hp: the hp of each user pokemon
+        - enemy_hp: the hp of each enemy pokemon
+        - user_damage: user_damage[i, j] is the damage user pokemon i deals to enemy pokemon j before the
+          random factor and critical hits
+        - enemy_damage: enemy_damage[j, i] is the damage enemy pokemon j deals to user pokemon i, likewise
+        - user_faster: user_faster[i, j] is 1 if user pokemon i outspeeds enemy pokemon j, 0.5 on a speed tie
+          and 0 otherwise
+    """
+    user_names: list[str]
+    enemy_names: list[str]
+    user_hp: np.ndarray
+    enemy_hp: np.ndarray
+    user_damage: np.ndarray
+    enemy_damage: np.ndarray
+    user_faster: np.ndarray
+
+    def __init__(self, user_rows: list[list], enemy_rows: list[list], graph: Any) -> None:
+        self.user_names = [row[1] for row in user_rows]
+        self.enemy_names = [row[1] for row in enemy_rows]
+        user_stats = np.array([battle_stats(row) for row in user_rows], dtype=np.float64)
+        enemy_stats = np.array([battle_stats(row) for row in enemy_rows], dtype=np.float64)
+        self.user_hp = user_stats[:, 0]
+        self.enemy_hp = enemy_stats[:, 0]
+        self.user_damage = _damage_matrix(user_rows, user_stats, enemy_rows, enemy_stats, graph)
+        self.enemy_damage = _damage_matrix(enemy_rows, enemy_stats, user_rows, user_stats, graph)
+        speed_difference = user_stats[:, 5, None] - enemy_stats[None, :, 5]
+        self.user_faster = np.where(speed_difference > 0, 1.0, np.where(speed_difference < 0, 0.0, 0.5))
+
+
+def _damage_matrix(attackers: list[list], attacker_stats: np.ndarray, defenders: list[list],
+                   defender_stats: np.ndarray, graph: Any) -> np.ndarray:
+    """return the damage of every attacker against every defender before the random factor and critical hits"""
+    effectiveness = np.array([[max(get_effectiveness(graph, move_type, _typing(defender))
+                                   for move_type in _attacking_types(attacker)) for defender in defenders]
+                              for attacker in attackers])
+    physical = attacker_stats[:, 1, None] / defender_stats[None, :, 2]
+    special = attacker_stats[:, 3, None] / defender_stats[None, :, 4]
+    base = (2 * LEVEL // 5 + 2) * MOVE_POWER * np.maximum(physical, special) / 50 + 2
+    return base * STAB * effectiveness
+
+
+def simulate_batch(setup: BattleSetup, battles: int, seed: Any = None) -> int:
+    """simulate a batch of battles and return how many the user team won
+
+    Battles still running after MAX_TURNS turns count as losses.
+    """
+    rng = np.random.default_rng(seed)
+    user_hp = np.tile(setup.user_hp, (battles, 1))
+    enemy_hp = np.tile(setup.enemy_hp, (battles, 1))
+    user_index = np.zeros(battles, dtype=np.intp)
+    enemy_index = np.zeros(battles, dtype=np.intp)
+    # the rows of the battles still running
+    active = np.arange(battles)
+    user_count = len(setup.user_hp)
+    enemy_count = len(setup.enemy_hp)
+
+    for _ in range(MAX_TURNS):
+        if active.size == 0:
+            break
+        ui = user_index[active]
+        ei = enemy_index[active]
+        rolls = rng.random((5, active.size))
+        user_hit = setup.user_damage[ui, ei] * (0.85 + 0.15 * rolls[0]) \
+            * np.where(rolls[1] < CRIT_CHANCE, CRIT_MULTIPLIER, 1.0)
+        enemy_hit = setup.enemy_damage[ei, ui] * (0.85 + 0.15 * rolls[2]) \
+            * np.where(rolls[3] < CRIT_CHANCE, CRIT_MULTIPLIER, 1.0)
+        user_first = rolls[4] < setup.user_faster[ui, ei]
+
+        user_left = user_hp[active, ui]
+        enemy_left = enemy_hp[active, ei]
+        # the slower pokemon only attacks if the first hit did not make it faint
+        enemy_after_first = np.where(user_first, enemy_left - user_hit, enemy_left)
+        user_after_first = np.where(user_first, user_left, user_left - enemy_hit)
+        user_left = np.where(user_first & (enemy_after_first > 0), user_after_first - enemy_hit, user_after_first)
+        enemy_left = np.where(~user_first & (user_after_first > 0), enemy_after_first - user_hit, enemy_after_first)
+        user_hp[active, ui] = user_left
+        enemy_hp[active, ei] = enemy_left
+
+        user_index[active] = ui + (user_left <= 0)
+        enemy_index[active] = ei + (enemy_left <= 0)
+        active = active[(user_index[active] < user_count) & (enemy_index[active] < enemy_count)]
+
+    return int(np.count_nonzero((enemy_index >= enemy_count) & (user_index < user_count)))
+
+
+def wilson_interval(wins: int, battles: int, z: float = Z_95) -> tuple[float, float]:
+    """return the Wilson score confidence interval of a win rate"""
+    if battles == 0:
+        return 0.0, 1.0
+    rate = wins / battles
+    denominator = 1 + z * z / battles
+    centre = (rate + z * z / (2 * battles)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / battles + z * z / (4 * battles * battles)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def simulate(setup: BattleSetup, battles: int = 1_000_000, workers: Optional[int] = None,
+             batch_size: int = 100_000, seed: Optional[int] = None) -> dict[str, Any]:
+    """simulate battles of the setup in batches spread over a process pool and return the win rate
+
+    Each batch gets its own random stream spawned from seed, so a seeded run is reproducible whatever the
+    number of workers.
+    """
+    sizes = [batch_size] * (battles // batch_size) + ([battles % batch_size] if battles % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    start = time.perf_counter()
+    if workers == 1 or len(sizes) == 1:
+        wins = sum(simulate_batch(setup, size, batch_seed) for size, batch_seed in zip(sizes, seeds))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            wins = sum(executor.map(simulate_batch, [setup] * len(sizes), sizes, seeds))
+    elapsed = time.perf_counter() - start
+    low, high = wilson_interval(wins, battles)
+    return {'battles': battles, 'wins': wins, 'win_rate': wins / battles if battles else 0.0,
+            'ci_low': low, 'ci_high': high, 'seconds': elapsed}
+
+
+def _named_rows(pokedex: Pokedex, names: list[str]) -> list[list]:
+    """return the rows of the named pokemon, resolving names and ids the same way the pokedex does
+
+    Raises ValueError if a name is not in the pokedex.
+    """
+    rows_by_id = {}
+    for row in pokedex.rows:
+        # the first row wins, like Pokedex.by_id
+        rows_by_id.setdefault(row[0], row)
+    rows = []
+    for name in names:
+        pokemon_id = pokedex.convert_pokemon_to_id(name)
+        if pokemon_id is None:
+            raise ValueError(f'unknown pokemon: {name}')
+        rows.append(rows_by_id[pokemon_id])
+    return rows
+
+
+def validate_recommendation(enemy_names: list[str], battles: int = 1_000_000, workers: Optional[int] = None,
+                            seed: Optional[int] = None, pokedex: Optional[Pokedex] = None,
+                            graph: Any = None) -> dict[str, Any]:
+    """simulate the team recommended by get_user_pokemon against the enemy team
+
+    Returns the win rate of the whole team battle and of each one on one duel shown by the game (the i-th
+    recommended pokemon against the i-th enemy). Raises ValueError if an enemy name is not in the pokedex.
+    """
+    from pokemon_final_team import get_user_pokemon
+
+    pokedex = pokedex if pokedex is not None else Pokedex()
+    graph = graph if graph is not None else graph_builder('chart.csv')
+    enemy_rows = _named_rows(pokedex, enemy_names)
+    enemy_team = pokedex.get_pokemon([row[0] for row in enemy_rows])
+    user_names, _ = get_user_pokemon(enemy_team, pokedex=pokedex, graph=graph)
+    user_rows = _named_rows(pokedex, user_names)
+
+    team = simulate(BattleSetup(user_rows, enemy_rows, graph), battles, workers, seed=seed)
+    duels = []
+    for user_row, enemy_row in zip(user_rows, enemy_rows):
+        duel = simulate(BattleSetup([user_row], [enemy_row], graph), max(1, battles // 10), 1, seed=seed)
+        duels.append({'user': user_row[1], 'enemy': enemy_row[1], **duel})
+    return {'user_team': user_names, 'enemy_team': [row[1] for row in enemy_rows], 'team': team, 'duels': duels}
+
+
+if __name__ == '__main__':
+    result = validate_recommendation(['Psyduck', 'Goldeen', 'Tangela', 'Kingler', 'Okidogi', 'Horsea'],
+                                     battles=2_000_000, seed=0)
+    team_result = result['team']
+    print("user team:", result['user_team'])
+    print("enemy team:", result['enemy_team'])
+    print(f"team win rate {team_result['win_rate']:.4f} "
+          f"(95% CI {team_result['ci_low']:.4f} - {team_result['ci_high']:.4f}), "
+          f"{team_result['battles'] / team_result['seconds'] * 60:,.0f} battles per minute")
+    for duel in result['duels']:
+        print(f"  {duel['user']} vs {duel['enemy']}: {duel['win_rate']:.3f} "
+              f"({duel['ci_low']:.3f} - {duel['ci_high']:.3f})")
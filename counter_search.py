@@ -0,0 +1,134 @@
+"""nearest neighbour search over pokemon matchup vectors
+
+Every pokemon is encoded as one vector made of three blocks:
+    - defense: the multiplier of each attacking type of the chart against the pokemon
+    - offense: the best multiplier of the pokemon's types against each defending type of the chart
+    - stats: the six base stats divided by 255, the highest possible base stat
+Pokemon with close vectors take and deal damage alike, so the nearest neighbours of a recommended pokemon
+are natural substitutes for it.
+"""
+from __future__ import annotations
+
+from typing import Any, Optional
+
+import numpy as np
+
+from graph_algorithm import graph_builder, get_effectiveness
+from pokedex import Pokedex
+from pokemon_data_stream import row_bst
+
+MAX_BASE_STAT = 255
+BLOCK_SIZE = 65536
+
+
+def matchup_vector(row: list, graph: Any, types: list[str]) -> list[float]:
+    """return the defense, offense and stats blocks of a processed row"""
+    typing = (row[2], row[3]) if row[3] else row[2]
+    attacking_types = (row[2], row[3]) if row[3] else (row[2],)
+    defense = [get_effectiveness(graph, attack_type, typing) for attack_type in types]
+    offense = [max(get_effectiveness(graph, move_type, defend_type) for move_type in attacking_types)
+               for defend_type in types]
+    stats = [stat / MAX_BASE_STAT for stat in row[4:10]]
+    return defense + offense + stats
+
+
+class CounterIndex:
+    """
+    A blocked brute force nearest neighbour index over the matchup vectors of a pokedex.
+
+    Queries scan the vectors BLOCK_SIZE rows at a time with NumPy, keeping only the best candidates of each
+    block, so memory stays bounded however large the pokedex is.
+
+    Instance Attributes:
+        - rows: the processed rows of the indexed pokemon
+        - vectors: the matchup vector of each row, in the same order
+        - bsts: the bst of each row, as Pokemon.bst computes it
+    """
+    rows: list[list]
+    vectors: np.ndarray
+    bsts: np.ndarray
+    _squared_norms: np.ndarray
+    _index_by_name: dict[str, int]
+
+    def __init__(self, pokedex: Optional[Pokedex] = None, graph: Any = None) -> None:
+        pokedex = pokedex if pokedex is not None else Pokedex()
+        graph = graph if graph is not None else graph_builder('chart.csv')
+        types = list(graph.vertices.keys())
+        self.rows = list(pokedex.rows)
+        self.vectors = np.array([matchup_vector(row, graph, types) for row in self.rows], dtype=np.float32)
+        self.bsts = np.array([row_bst(row) for row in self.rows])
+        self._squared_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self._index_by_name = {}
+        for index, row in enumerate(self.rows):
+            self._index_by_name.setdefault(row[1].lower(), index)
+
+    def vector(self, name: str) -> np.ndarray:
+        """return the matchup vector of the named pokemon"""
+        return self.vectors[self._index_by_name[name.lower()]]
+
+    def _allowed(self, start: int, stop: int, bst_range: Optional[list[int]], exclude: set[int]) -> np.ndarray:
+        """return which rows of a block may be returned"""
+        allowed = np.ones(stop - start, dtype=bool)
+        if bst_range is not None:
+            allowed &= (self.bsts[start:stop] >= bst_range[0]) & (self.bsts[start:stop] <= bst_range[1])
+        for index in exclude:
+            if start <= index < stop:
+                allowed[index - start] = False
+        return allowed
+
+    def _block_distances(self, query: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """return the euclidean distances from query to the rows of a block"""
+        squared = self._squared_norms[start:stop] - 2 * self.vectors[start:stop] @ query + query @ query
+        return np.sqrt(np.maximum(squared, 0))
+
+    def knn(self, query: np.ndarray, k: int, bst_range: Optional[list[int]] = None,
+            exclude: Optional[set[int]] = None) -> list[tuple[int, float]]:
+        """return the (row index, distance) of the k rows closest to query, closest first
+
+        Only rows with a bst within bst_range, if given, and not in exclude are considered.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        exclude = exclude or set()
+        best_indices = np.empty(0, dtype=np.intp)
+        best_distances = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self.rows), BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, len(self.rows))
+            distances = self._block_distances(query, start, stop)
+            candidates = np.flatnonzero(self._allowed(start, stop, bst_range, exclude))
+            if candidates.size > k:
+                candidates = candidates[np.argpartition(distances[candidates], k)[:k]]
+            best_indices = np.concatenate([best_indices, candidates + start])
+            best_distances = np.concatenate([best_distances, distances[candidates]])
+            if best_indices.size > k:
+                keep = np.argpartition(best_distances, k)[:k]
+                best_indices, best_distances = best_indices[keep], best_distances[keep]
+        order = np.lexsort((best_indices, best_distances))
+        return [(int(best_indices[i]), float(best_distances[i])) for i in order]
+
+    def radius(self, query: np.ndarray, radius: float, bst_range: Optional[list[int]] = None,
+               exclude: Optional[set[int]] = None) -> list[tuple[int, float]]:
+        """return the (row index, distance) of every row within radius of query, closest first"""
+        query = np.asarray(query, dtype=np.float32)
+        exclude = exclude or set()
+        found = []
+        for start in range(0, len(self.rows), BLOCK_SIZE):
+            stop = min(start + BLOCK_SIZE, len(self.rows))
+            distances = self._block_distances(query, start, stop)
+            within = np.flatnonzero(self._allowed(start, stop, bst_range, exclude) & (distances <= radius))
+            found.extend((int(index + start), float(distances[index])) for index in within)
+        return sorted(found, key=lambda item: (item[1], item[0]))
+
+    def similar(self, name: str, k: int, bst_range: Optional[list[int]] = None,
+                exclude_names: Optional[list[str]] = None) -> list[str]:
+        """return the names of the k pokemon most like the named one, excluding itself and exclude_names"""
+        exclude = {self._index_by_name[other.lower()] for other in (exclude_names or []) + [name]
+                   if other.lower() in self._index_by_name}
+        return [self.rows[index][1] for index, _ in self.knn(self.vector(name), k, bst_range, exclude)]
+
+
+if __name__ == '__main__':
+    counter_index = CounterIndex()
+    print("most like Garchomp:", counter_index.similar('Garchomp', 5))
+    print("most like Pikachu with a bst of 300 to 400:", counter_index.similar('Pikachu', 5, [300, 400]))
+    near = counter_index.radius(counter_index.vector('Charizard'), 0.3)
+    print("within 0.3 of Charizard:", [counter_index.rows[index][1] for index, _ in near])
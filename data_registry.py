@@ -0,0 +1,206 @@
+"""data registry that reloads the chart and pokedex files when they change
+
+A DataRegistry owns the current DataSnapshot: the parsed chart, the parsed pokedex and any derived structures
+built from them (precomputed stores, counter indexes, ...). A background thread polls both files and, when
+one changes, parses it into a new snapshot and swaps it in with a single assignment. Derived structures are
+registered with the files they depend on, and only the ones depending on the changed file are rebuilt; the
+others are carried over to the new snapshot as they are.
+
+Requests should take one snapshot at their start and use it throughout, so they finish on consistent data
+even if a reload happens meanwhile. Nothing is parsed on the request path.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import weakref
+from typing import Any, Callable, Optional
+
+from graph_algorithm import graph_builder
+from pokedex import Pokedex
+
+CHART = 'chart'
+POKEDEX = 'pokedex'
+
+
+class DerivedSpec:
+    """
+    How to build a structure derived from a snapshot.
+
+    Instance Attributes:
+        - build: a function from a DataSnapshot to the structure
+        - depends_on: the files (CHART and/or POKEDEX) the structure is built from
+        - eager: whether a reload builds the structure in the background before the swap, instead of on first
+          use of the new snapshot
+        - close: a function releasing the structure (e.g. closing its files) once no snapshot uses it, if any
+    """
+    build: Callable[[DataSnapshot], Any]
+    depends_on: frozenset[str]
+    eager: bool
+    close: Optional[Callable[[Any], None]]
+
+    def __init__(self, build: Callable[[DataSnapshot], Any], depends_on: tuple[str, ...], eager: bool,
+                 close: Optional[Callable[[Any], None]] = None) -> None:
+        self.build = build
+        self.depends_on = frozenset(depends_on)
+        self.eager = eager
+        self.close = close
+
+
+class DataSnapshot:
+    """
+    One consistent version of the data files and the structures derived from them.
+
+    Instance Attributes:
+        - version: increases by one with every reload
+        - file_types: the path of the chart file
+        - file_pokemon: the path of the pokemon data file
+        - graph: the type graph parsed from file_types
+        - pokedex: the pokedex parsed from file_pokemon
+        - signatures: a dictionary mapping CHART and POKEDEX to the file signature they were parsed at
+    """
+    version: int
+    file_types: str
+    file_pokemon: str
+    graph: Any
+    pokedex: Pokedex
+    signatures: dict[str, tuple]
+    _specs: dict[str, DerivedSpec]
+    _derived: dict[str, Any]
+    _lock: threading.RLock
+
+    def __init__(self, version: int, file_types: str, file_pokemon: str, graph: Any, pokedex: Pokedex,
+                 signatures: dict[str, tuple], specs: dict[str, DerivedSpec],
+                 derived: Optional[dict[str, Any]] = None) -> None:
+        self.version = version
+        self.file_types = file_types
+        self.file_pokemon = file_pokemon
+        self.graph = graph
+        self.pokedex = pokedex
+        self.signatures = signatures
+        self._specs = specs
+        self._derived = dict(derived or {})
+        # reentrant, so a derived structure can be built from another one
+        self._lock = threading.RLock()
+
+    def derived(self, name: str) -> Any:
+        """return the named derived structure of this snapshot, building it on first use"""
+        if name not in self._derived:
+            with self._lock:
+                if name not in self._derived:
+                    self._derived[name] = self._specs[name].build(self)
+        return self._derived[name]
+
+    def built(self) -> dict[str, Any]:
+        """return the derived structures built so far"""
+        with self._lock:
+            return dict(self._derived)
+
+
+def file_signature(file_path: str) -> tuple:
+    """return what identifies a version of a file: its modification time, size and inode"""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class DataRegistry:
+    """
+    The current snapshot of the data files, reloaded in the background when they change.
+
+    Instance Attributes:
+        - file_types: the path of the chart file
+        - file_pokemon: the path of the pokemon data file
+        - poll_interval: the number of seconds between checks of the files
+        - last_error: the error of the last failed reload, if any (the previous snapshot stays in use)
+    """
+    file_types: str
+    file_pokemon: str
+    poll_interval: float
+    last_error: Optional[Exception]
+    _snapshot: DataSnapshot
+    _specs: dict[str, DerivedSpec]
+    _reload_lock: threading.Lock
+    _stop: threading.Event
+    _thread: Optional[threading.Thread]
+
+    def __init__(self, file_pokemon: str = 'pokemon_data.csv', file_types: str = 'chart.csv',
+                 poll_interval: float = 1.0) -> None:
+        self.file_types = file_types
+        self.file_pokemon = file_pokemon
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self._specs = {}
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        signatures = {CHART: file_signature(file_types), POKEDEX: file_signature(file_pokemon)}
+        self._snapshot = DataSnapshot(0, file_types, file_pokemon, graph_builder(file_types), Pokedex(file_pokemon),
+                                      signatures, self._specs)
+
+    def snapshot(self) -> DataSnapshot:
+        """return the current snapshot; keep using it for the whole of a request"""
+        return self._snapshot
+
+    def register(self, name: str, build: Callable[[DataSnapshot], Any],
+                 depends_on: tuple[str, ...] = (CHART, POKEDEX), eager: bool = False,
+                 close: Optional[Callable[[Any], None]] = None) -> None:
+        """register a derived structure, built from a snapshot by build and invalidated when depends_on change
+
+        close, if given, releases a structure that was invalidated, once the last request using the snapshot it
+        belongs to is done with it.
+        """
+        self._specs[name] = DerivedSpec(build, depends_on, eager, close)
+
+    def check(self) -> bool:
+        """reload the files that changed since the current snapshot and return whether a new one was swapped in"""
+        with self._reload_lock:
+            current = self._snapshot
+            try:
+                signatures = {CHART: file_signature(self.file_types), POKEDEX: file_signature(self.file_pokemon)}
+                changed = {name for name in signatures if signatures[name] != current.signatures[name]}
+                if not changed:
+                    return False
+                graph = graph_builder(self.file_types) if CHART in changed else current.graph
+                pokedex = Pokedex(self.file_pokemon) if POKEDEX in changed else current.pokedex
+
+                kept = {name: value for name, value in current.built().items()
+                        if not self._specs[name].depends_on & changed}
+                snapshot = DataSnapshot(current.version + 1, self.file_types, self.file_pokemon, graph, pokedex,
+                                        signatures, self._specs, kept)
+                for name, spec in self._specs.items():
+                    if spec.eager:
+                        snapshot.derived(name)
+            except Exception as error:  # e.g. a file caught half written; retried on the next check
+                self.last_error = error
+                return False
+            self._snapshot = snapshot
+            self.last_error = None
+            # requests may still hold the previous snapshot, so its dropped structures are closed when it is freed
+            weakref.finalize(current, _close_dropped, current._derived, frozenset(kept), self._specs)
+            return True
+
+    def start(self) -> None:
+        """start polling the files in a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name='data-registry', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """stop polling the files"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self) -> None:
+        """check the files every poll_interval seconds until stopped"""
+        while not self._stop.wait(self.poll_interval):
+            self.check()
+
+
+def _close_dropped(derived: dict[str, Any], kept: frozenset[str], specs: dict[str, DerivedSpec]) -> None:
+    """close the structures of a freed snapshot that were not carried over to the next one"""
+    for name, value in derived.items():
+        if name not in kept and specs[name].close is not None:
+            specs[name].close(value)
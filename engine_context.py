@@ -0,0 +1,176 @@
+"""engine contexts holding one type chart, the pokedex it applies to and the structures derived from them
+
+Type charts differ by generation, so recommend_top_types and get_user_pokemon take an EngineContext instead
+of reading chart.csv. GENERATION_CHARTS lists the charts shipped with the game. Several contexts can be held
+at once in EngineContexts, and it shares whatever the charts have in common:
+    - each pokemon data file is parsed once. The pokedex of a context is a view of that parse that gives every
+      pokemon the typing it had under the chart (see pokedex.chart_typing: Clefairy is Normal and Magnemite
+      Electric in generation 1, for example), sharing the rows and Pokemon whose typing did not change
+    - charts with the same content share one type graph
+    - derived structures (precomputed stores, counter indexes, ...) are cached by the chart and pokedex they
+      are built from, so contexts with the same chart and pokedex build them once
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Optional
+
+from counter_search import CounterIndex
+from data_registry import CHART, POKEDEX
+from graph_algorithm import graph_from_chart
+from pokedex import Pokedex
+from pokemon_type_data_scraper import read_effectiveness
+from precompute import chart_hash, load_store
+from recommender_session import RecommenderSession
+
+GENERATION_CHARTS = {'gen1': 'chart_gen1.csv', 'gen2-5': 'chart_gen2_5.csv', 'gen6+': 'chart.csv'}
+DEFAULT_GENERATION = 'gen6+'
+
+
+class EngineContext:
+    """
+    One ruleset of the recommendation engine.
+
+    Instance Attributes:
+        - name: the name of the context, e.g. a generation of GENERATION_CHARTS
+        - file_types: the path of the chart file
+        - file_pokemon: the path of the pokemon data file
+        - chart_hash: the digest of the chart file (see precompute.chart_hash)
+        - types: the types of the chart
+        - graph: the type graph of the chart
+        - pokedex: the pokemon of the data file, with the typing they had under the chart
+        - store: the precomputed recommendations for the chart, or None if there are none
+    """
+    name: str
+    file_types: str
+    file_pokemon: str
+    chart_hash: str
+    types: list[str]
+    graph: Any
+    pokedex: Pokedex
+    store: Any
+    _derived: dict[tuple, Any]
+    _lock: threading.Lock
+
+    def __init__(self, name: str, file_types: str, file_pokemon: str, chart_digest: str, types: list[str],
+                 graph: Any, pokedex: Pokedex, store: Any = None, derived: Optional[dict[tuple, Any]] = None,
+                 lock: Optional[threading.Lock] = None) -> None:
+        self.name = name
+        self.file_types = file_types
+        self.file_pokemon = file_pokemon
+        self.chart_hash = chart_digest
+        self.types = types
+        self.graph = graph
+        self.pokedex = pokedex
+        self.store = store
+        # shared with the other contexts of the same EngineContexts
+        self._derived = derived if derived is not None else {}
+        self._lock = lock if lock is not None else threading.Lock()
+
+    def derived(self, name: str, build: Callable[[EngineContext], Any],
+                depends_on: tuple[str, ...] = (CHART, POKEDEX)) -> Any:
+        """return the named structure built from this context, building it only once for every context with the
+        same depends_on (CHART and/or POKEDEX)"""
+        key = (name,)
+        if CHART in depends_on:
+            key += (self.chart_hash,)
+        if POKEDEX in depends_on:
+            key += (self.file_pokemon, frozenset(self.types))
+        if key not in self._derived:
+            with self._lock:
+                if key not in self._derived:
+                    self._derived[key] = build(self)
+        return self._derived[key]
+
+    def counter_index(self) -> CounterIndex:
+        """return the nearest neighbour index over the matchup vectors of the pokedex"""
+        return self.derived('counter_index', lambda context: CounterIndex(context.pokedex, context.graph))
+
+    def session(self, team_size: int = 6) -> RecommenderSession:
+        """return a new recommender session using the chart, graph and store of this context"""
+        return RecommenderSession(team_size, self.file_types, self.store, self.graph)
+
+
+class EngineContexts:
+    """
+    Named engine contexts living in one process, sharing the data their charts and data files have in common.
+
+    Instance Attributes:
+        - contexts: a dictionary mapping context names to their EngineContext
+    """
+    contexts: dict[str, EngineContext]
+    _charts: dict[str, tuple[list[str], Any]]
+    _pokedexes: dict[str, Pokedex]
+    _views: dict[tuple, Pokedex]
+    _stores: dict[tuple, Any]
+    _derived: dict[tuple, Any]
+    _lock: threading.Lock
+    _derived_lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.contexts = {}
+        self._charts = {}
+        self._pokedexes = {}
+        self._views = {}
+        self._stores = {}
+        self._derived = {}
+        self._lock = threading.Lock()
+        self._derived_lock = threading.Lock()
+
+    def add(self, name: str, file_types: str = 'chart.csv', file_pokemon: str = 'pokemon_data.csv',
+            store_path: Optional[str] = 'recommendations.db') -> EngineContext:
+        """load the chart at file_types as a new context named name and return it
+
+        The precomputed store at store_path is used if it was built from this chart.
+        """
+        with self._lock:
+            digest = chart_hash(file_types)
+            if digest not in self._charts:
+                types, effectiveness = read_effectiveness(file_types)
+                self._charts[digest] = (types, graph_from_chart(types, effectiveness))
+            types, graph = self._charts[digest]
+
+            if file_pokemon not in self._pokedexes:
+                self._pokedexes[file_pokemon] = Pokedex(file_pokemon)
+            view_key = (file_pokemon, frozenset(types))
+            if view_key not in self._views:
+                self._views[view_key] = self._pokedexes[file_pokemon].retyped(set(types))
+
+            store_key = (store_path, digest)
+            if store_path is not None and store_key not in self._stores:
+                self._stores[store_key] = load_store(store_path, file_types)
+
+            context = EngineContext(name, file_types, file_pokemon, digest, types, graph, self._views[view_key],
+                                    self._stores.get(store_key), self._derived, self._derived_lock)
+            self.contexts[name] = context
+            return context
+
+    def get(self, name: str) -> EngineContext:
+        """return the context named name"""
+        return self.contexts[name]
+
+
+def load_generations(file_pokemon: str = 'pokemon_data.csv',
+                     store_path: Optional[str] = 'recommendations.db') -> EngineContexts:
+    """return a context for each generation of GENERATION_CHARTS"""
+    contexts = EngineContexts()
+    for generation, file_types in GENERATION_CHARTS.items():
+        contexts.add(generation, file_types, file_pokemon, store_path)
+    return contexts
+
+
+def load_context(generation: str = DEFAULT_GENERATION, file_pokemon: str = 'pokemon_data.csv',
+                 store_path: Optional[str] = 'recommendations.db') -> EngineContext:
+    """return the context of a single generation of GENERATION_CHARTS"""
+    return EngineContexts().add(generation, GENERATION_CHARTS[generation], file_pokemon, store_path)
+
+
+if __name__ == '__main__':
+    from pokemon_final_team import get_user_pokemon
+
+    generations = load_generations()
+    for context_name, engine_context in generations.contexts.items():
+        enemy_team = engine_context.pokedex.get_pokemon([54, 60, 114, 116, 90])
+        user_team, matchups = get_user_pokemon(enemy_team, context=engine_context)
+        print(f"{context_name} ({len(engine_context.types)} types, {len(engine_context.pokedex.rows)} pokemon):",
+              user_team)
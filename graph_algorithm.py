@@ -9,6 +9,12 @@ def graph_builder(file_path):
     """return the type graph
     """
     types, effectiveness = read_effectiveness(file_path)
+    return graph_from_chart(types, effectiveness)
+
+
+def graph_from_chart(types, effectiveness):
+    """return the type graph of an already read chart (see read_effectiveness)
+    """
     type_indices = {type_name: idx for idx, type_name in enumerate(types)}
     graph = pokemon_class.TypeGraph()
     for p_type in types:
@@ -41,50 +47,65 @@ def get_overall_effectiveness(graph, recommended_types, enemy_types):
         return max(get_effectiveness(graph, r, enemy_types) for r in recommended_types)
 
 
-def strong_weak(chosen_pokemons):
+def enemy_strong_weak(graph, chosen_pokemon):
+    """return the strong and weak tallies contributed by a single pokemon of the team
+    """
+    strong = {}
+    weak = {}
+    all_types = list(graph.vertices.keys())
+
+    if isinstance(chosen_pokemon, tuple):
+        for pok_type in all_types:
+            max_eff = max(get_effectiveness(graph, chosen_pokemon[0], pok_type),
+                          get_effectiveness(graph, chosen_pokemon[1], pok_type))
+            if max_eff == 2.0:
+                strong[pok_type] = strong.get(pok_type, 0) + 1
+            elif max_eff in (0.5, 0.0):
+                weak[pok_type] = weak.get(pok_type, 0) + 1
+
+        for pok_type in all_types:
+            combined_eff = get_effectiveness(graph, pok_type, chosen_pokemon)
+            if combined_eff > 1.0:
+                weak[pok_type] = weak.get(pok_type, 0) + 1
+            elif combined_eff < 1.0:
+                strong[pok_type] = strong.get(pok_type, 0) + 1
+    else:
+        pokemon_vertex = graph.vertices[chosen_pokemon]
+        for out in pokemon_vertex.outgoing_neighbors:
+            if out == 2.0:
+                for pokemon in pokemon_vertex.outgoing_neighbors[out]:
+                    poke = pokemon.item
+                    strong[poke] = strong.get(poke, 0) + 1
+            elif out in (0.5, 0.0):
+                for pokemon in pokemon_vertex.outgoing_neighbors[out]:
+                    poke = pokemon.item
+                    weak[poke] = weak.get(poke, 0) + 1
+        for inc in pokemon_vertex.incoming_neighbors:
+            if inc == 2.0:
+                for pokemon in pokemon_vertex.incoming_neighbors[inc]:
+                    poke = pokemon.item
+                    weak[poke] = weak.get(poke, 0) + 1
+            elif inc in (0.5, 0.0):
+                for pokemon in pokemon_vertex.incoming_neighbors[inc]:
+                    poke = pokemon.item
+                    strong[poke] = strong.get(poke, 0) + 1
+    return strong, weak
+
+
+def strong_weak(chosen_pokemons, graph=None, file_path='chart.csv'):
     """return the strong and weak dictionary of the given team
      """
     strong = {}
     weak = {}
-    graph = graph_builder(file_path='chart.csv')
-    all_types = list(graph.vertices.keys())
+    if graph is None:
+        graph = graph_builder(file_path=file_path)
 
     for chosen_pokemon in chosen_pokemons:
-        if isinstance(chosen_pokemon, tuple):
-            for pok_type in all_types:
-                max_eff = max(get_effectiveness(graph, chosen_pokemon[0], pok_type),
-                              get_effectiveness(graph, chosen_pokemon[1], pok_type))
-                if max_eff == 2.0:
-                    strong[pok_type] = strong.get(pok_type, 0) + 1
-                elif max_eff in (0.5, 0.0):
-                    weak[pok_type] = weak.get(pok_type, 0) + 1
-
-            for pok_type in all_types:
-                combined_eff = get_effectiveness(graph, pok_type, chosen_pokemon)
-                if combined_eff > 1.0:
-                    weak[pok_type] = weak.get(pok_type, 0) + 1
-                elif combined_eff < 1.0:
-                    strong[pok_type] = strong.get(pok_type, 0) + 1
-        else:
-            pokemon_vertex = graph.vertices[chosen_pokemon]
-            for out in pokemon_vertex.outgoing_neighbors:
-                if out == 2.0:
-                    for pokemon in pokemon_vertex.outgoing_neighbors[out]:
-                        poke = pokemon.item
-                        strong[poke] = strong.get(poke, 0) + 1
-                elif out in (0.5, 0.0):
-                    for pokemon in pokemon_vertex.outgoing_neighbors[out]:
-                        poke = pokemon.item
-                        weak[poke] = weak.get(poke, 0) + 1
-            for inc in pokemon_vertex.incoming_neighbors:
-                if inc == 2.0:
-                    for pokemon in pokemon_vertex.incoming_neighbors[inc]:
-                        poke = pokemon.item
-                        weak[poke] = weak.get(poke, 0) + 1
-                elif inc in (0.5, 0.0):
-                    for pokemon in pokemon_vertex.incoming_neighbors[inc]:
-                        poke = pokemon.item
-                        strong[poke] = strong.get(poke, 0) + 1
+        enemy_strong, enemy_weak = enemy_strong_weak(graph, chosen_pokemon)
+        for poke, count in enemy_strong.items():
+            strong[poke] = strong.get(poke, 0) + count
+        for poke, count in enemy_weak.items():
+            weak[poke] = weak.get(poke, 0) + count
     return strong, weak
 
 
@@ -124,20 +145,24 @@ def get_defense_effectiveness(graph, attack_type, defend_types):
     return multiplier
 
 
+def score_enemy(graph, candidate_types, enemy):
+    """Score a candidate type against a single enemy of the team."""
+    if isinstance(candidate_types, str):
+        candidate_list = (candidate_types,)
+    else:
+        candidate_list = candidate_types
+    off_eff = max(
+        get_attacking_effectiveness(graph, c, enemy) if isinstance(enemy, str) else get_effectiveness(graph, c, enemy)
+        for c in candidate_list)
+    def_vuln = get_defense_effectiveness(graph, enemy, candidate_list)
+    return off_eff - def_vuln
+
+
 def score_candidate(graph, candidate_types, enem_team):
     """Score a candidate type against the enemy team."""
     score = 0
     for enemy in enem_team:
-        if isinstance(candidate_types, str):
-            candidate_list = (candidate_types,)
-        else:
-            candidate_list = candidate_types
-        off_eff = max(
-            get_attacking_effectiveness(graph, c, enemy) if isinstance(enemy, str) else get_effectiveness(graph, c,
-                                                                                                          enemy) for c
-            in candidate_list)
-        def_vuln = get_defense_effectiveness(graph, enemy, candidate_list)
-        score += off_eff - def_vuln
+        score += score_enemy(graph, candidate_types, enemy)
     return score
 
 
@@ -177,55 +202,95 @@ def score_assigner(final_dict, enemy_types, graph):
     return temp
 
 
-def recommend_top_types(enemy_team, file_path='chart.csv', top_x=None):
-    """Recommend the top X types against the enemy team."""
-    if top_x is None:
-        top_x = len(enemy_team)
+def match_candidates(graph, ranked_candidates, enemy_team):
+    """Pair each ranked candidate with the remaining enemy it hits hardest.
+
+    Returns the [type, enemy] pairs and the enemies left without a candidate.
+    """
+    enemy_team_copy = list(enemy_team[:])
+    results = []
+    for cand, _ in ranked_candidates:
+        rec_type = cand[0] if len(cand) == 1 else cand
+        effectivenesses = [get_overall_effectiveness(graph, rec_type, enemy) for enemy in enemy_team_copy]
+        max_eff = max(effectivenesses)
+        target_index = effectivenesses.index(max_eff)
+        target_enemy = enemy_team_copy.pop(target_index)
+        results.append([rec_type, target_enemy])
+    return results, enemy_team_copy
 
-    graph = graph_builder(file_path)
 
-    strong, weak = strong_weak(enemy_team)
-    final_dict = dict_subtraction(strong, weak)
+def chart_ordered_types(graph, final_dict):
+    """return the types of final_dict in chart order, or every type of the chart if it is empty
 
+    Chart order keeps the candidates the same whatever order the strong and weak tallies were built in.
+    """
     if not final_dict:
-        types = list(graph.vertices.keys())
-    else:
-        types = list(final_dict.keys())
+        return list(graph.vertices.keys())
+    return [p_type for p_type in graph.vertices if p_type in final_dict]
+
 
-    # types = list(final_dict.keys())
+def candidate_pairs(types):
+    """return the single and dual type candidates made of the given types"""
     single_types = [(t,) for t in types]
     dual_types = [(types[i], types[j]) for i in range(len(types)) for j in range(i + 1, len(types))]
-    candidates = single_types + dual_types
+    return single_types + dual_types
+
+
+def sort_candidates(scores):
+    """return the (candidate, score) pairs best first, keeping tied candidates in the order scores lists them
+
+    scores is built from candidate_pairs over chart_ordered_types, so ties are broken by chart index.
+    """
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+def rank_candidates(graph, enemy_team):
+    """return every candidate ranked against the enemy team, as (candidate, score) pairs best first"""
+    strong, weak = strong_weak(enemy_team, graph)
+    types = chart_ordered_types(graph, dict_subtraction(strong, weak))
     scores = {}
-    for cand in candidates:
+    for cand in candidate_pairs(types):
         scores[cand] = score_candidate(graph, cand, enemy_team)
+    return sort_candidates(scores)
 
-    sorted_candidates = sorted(scores.items(), key=lambda x: x[1], reverse=True)
 
-    enemy_team_copy = list(enemy_team[:])
-    results = []
+def recommend_top_types(enemy_team, file_path='chart.csv', top_x=None, graph=None, store=None, context=None):
+    """Recommend the top X types against the enemy team.
+
+    A preloaded graph can be passed to skip rebuilding it from file_path. A store of precomputed
+    rankings (see precompute.PrecomputedStore) is consulted first when one is given.
+    An engine context (see engine_context.EngineContext) supplies the chart, graph and store instead.
+    """
+    if top_x is None:
+        top_x = len(enemy_team)
+
+    if context is not None:
+        file_path = context.file_types
+        graph = graph if graph is not None else context.graph
+        store = store if store is not None else context.store
+
+    if graph is None:
+        graph = graph_builder(file_path)
+
+    sorted_candidates = None
+    if store is not None and top_x == len(enemy_team):
+        sorted_candidates = store.ranked(enemy_team)
+    if sorted_candidates is None:
+        sorted_candidates = rank_candidates(graph, enemy_team)
+    return match_ranked(graph, sorted_candidates, enemy_team, top_x, file_path)
 
-    if len(sorted_candidates) >= len(enemy_team_copy):
-        top_candidates = sorted_candidates[:top_x]
 
-        for cand, score in top_candidates:
-            rec_type = cand[0] if len(cand) == 1 else cand
-            effectivenesses = [get_overall_effectiveness(graph, rec_type, enemy) for enemy in enemy_team_copy]
-            max_eff = max(effectivenesses)
-            target_index = effectivenesses.index(max_eff)
-            target_enemy = enemy_team_copy.pop(target_index)
-            results.append([rec_type, target_enemy])
+def match_ranked(graph, sorted_candidates, enemy_team, top_x, file_path='chart.csv'):
+    """Match the ranked candidates to the enemy team, recursing on the enemies left over when there are
+    fewer candidates than enemies, and return the (type, enemy) pairs in enemy team order."""
+    if len(sorted_candidates) >= len(enemy_team):
+        results, _ = match_candidates(graph, sorted_candidates[:top_x], enemy_team)
     else:
-        for cand, score in sorted_candidates:
-            rec_type = cand[0] if len(cand) == 1 else cand
-            effectivenesses = [get_overall_effectiveness(graph, rec_type, enemy) for enemy in enemy_team_copy]
-            max_eff = max(effectivenesses)
-            target_index = effectivenesses.index(max_eff)
-            target_enemy = enemy_team_copy.pop(target_index)
-            results.append([rec_type, target_enemy])
+        results, enemy_team_copy = match_candidates(graph, sorted_candidates, enemy_team)
 
         if enemy_team_copy:
-            results.extend(recommend_top_types(enemy_team_copy, file_path='chart.csv', top_x=len(enemy_team_copy)))
+            results.extend(recommend_top_types(enemy_team_copy, file_path=file_path, top_x=len(enemy_team_copy),
+                                               graph=graph))
 
     results_dict = {enemy: rec for rec, enemy in results}
     ordered_results = [(results_dict[enemy], enemy) for enemy in enemy_team]
@@ -0,0 +1,110 @@
+"""latency and throughput load test for the local recommendation server
+
+Start the server with `python recommendation_server.py`, then run
+`python load_test.py [--requests 500] [--concurrency 16] [--endpoint recommend]`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote
+
+from pokedex import Pokedex
+
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, method: str, path: str,
+                   payload: dict = None) -> int:
+    """send one keep-alive request and return the response status"""
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write((f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                  f'Content-Length: {len(body)}\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+def _make_request(endpoint: str, names: list[str], rng: random.Random) -> tuple[str, str, dict]:
+    """return a random method, path and payload for the endpoint"""
+    if endpoint == 'pokemon':
+        return 'GET', '/pokemon?name=' + quote(rng.choice(names)), None
+    elif endpoint == 'matchup':
+        return 'GET', '/matchup?attacker=Fire&defender=Grass,Steel', None
+    return 'POST', '/recommend', {'team': rng.sample(names, 6)}
+
+
+async def _client(host: str, port: int, endpoint: str, names: list[str], remaining: list[int], seed: int,
+                  latencies: list[float], statuses: dict[int, int]) -> None:
+    """send requests over one connection until the shared request budget runs out"""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            method, path, payload = _make_request(endpoint, names, rng)
+            start = time.perf_counter()
+            status = await _request(reader, writer, host, method, path, payload)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """return the nearest-rank percentile of already sorted values"""
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_load_test(host: str, port: int, endpoint: str, requests: int, concurrency: int,
+                        seed: int = 0) -> dict[str, float]:
+    """send requests to the server from concurrent connections and return the latency and throughput summary"""
+    names = [row[1] for row in Pokedex().rows]
+    latencies = []
+    statuses = {}
+    remaining = [requests]
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, endpoint, names, remaining, seed + i, latencies, statuses)
+                           for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'statuses': statuses
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--endpoint', choices=['recommend', 'pokemon', 'matchup'], default='recommend')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load_test(args.host, args.port, args.endpoint, args.requests, args.concurrency,
+                                        args.seed))
+    print(f"{summary['requests']} requests in {summary['seconds']:.2f}s "
+          f"({summary['throughput']:.1f} req/s)")
+    print(f"latency p50 {summary['p50_ms']:.1f}ms, p95 {summary['p95_ms']:.1f}ms, "
+          f"p99 {summary['p99_ms']:.1f}ms, max {summary['max_ms']:.1f}ms")
+    print("status codes:", summary['statuses'])
@@ -1,14 +1,13 @@
 """Main file for the Pokémon Battle Matchup Optimizer."""
 import io
-import random
 import math
 from typing import Optional, Dict, List, Tuple
 import pygame
 import requests
-import pandas as pd
-from pokemon_data_scraper import convert_pokemon_to_id
-from pokemon_final_team import get_user_pokemon, get_pokemon
-from pokemon_class import Pokemon
+from pokemon_final_team import get_user_pokemon, get_substitutes
+from team_generator import TeamGenerator
+from recommender_session import RecommenderSession
+from engine_context import EngineContext, load_context
 
 pygame.init()
 
@@ -16,10 +15,12 @@ WIDTH, HEIGHT = 800, 600
 BLACK, WHITE, RED = (0, 0, 0), (255, 255, 255), (255, 0, 0)
 ENEMY_TEAM_OFFSET, USER_TEAM_OFFSET = 250, 440
 FONT = pygame.font.SysFont("consolas", 20)
+SMALL_FONT = pygame.font.SysFont("consolas", 14)
 BASE_URL = "https://img.pokemondb.net/sprites/"
 ADD_ONS = ("scarlet-violet/normal/1x/", "x-y/normal/", "sun-moon/normal/1x/", "sword-shield/normal/", "home/normal/1x/")
 
 START_SCREEN, INPUT_SCREEN, RESULT_SCREEN = range(3)
+SUBSTITUTES = 1  # the number of substitutes shown under each recommended Pokémon
 
 
 class Game:
@@ -31,6 +32,7 @@ class Game:
         - state: the current game state
         - enemy_team: the enemy team of Pokémon
         - user_team: the user team of Pokémon
+        - substitutes: the closest alternatives to each Pokémon of the user team
         - running: whether the game is running
         - input_index: the current index for inputting Pokémon names
         - error_message: an error message to display
@@ -39,12 +41,16 @@ class Game:
         - enter_button: the enter button rectangle
         - random_button: the random button rectangle
         - back_button: the back button rectangle
+        - context: the type chart and pokedex recommendations are made with
+        - recommender: the recommender session reused between submitted enemy teams
+        - team_generator: the generator of random enemy teams, with the pokedex loaded once
     """
     screen: pygame.Surface
     background: pygame.Surface
     state: int
     enemy_team: list[str]
     user_team: list[str]
+    substitutes: dict[str, list[str]]
     running: bool
     input_index: int
     error_message: Optional[str]
@@ -53,13 +59,18 @@ class Game:
     enter_button: Optional[pygame.Rect]
     random_button: Optional[pygame.Rect]
     back_button: Optional[pygame.Rect]
+    context: EngineContext
+    recommender: RecommenderSession
+    team_generator: TeamGenerator
 
     def __init__(self, screen: Optional[pygame.Surface] = None, background: Optional[pygame.Surface] = None,
                  state: int = START_SCREEN, enemy_team: Optional[List[str]] = None,
                  user_team: Optional[List[str]] = None, running: bool = True, input_index: int = 0,
                  error_message: Optional[str] = None, pokemon_sprites: Optional[Dict[str, pygame.Surface]] = None,
                  start_button: Optional[pygame.Rect] = None, enter_button: Optional[pygame.Rect] = None,
-                 random_button: Optional[pygame.Rect] = None, back_button: Optional[pygame.Rect] = None) -> None:
+                 random_button: Optional[pygame.Rect] = None, back_button: Optional[pygame.Rect] = None,
+                 recommender: Optional[RecommenderSession] = None,
+                 team_generator: Optional[TeamGenerator] = None, context: Optional[EngineContext] = None) -> None:
         pygame.display.set_caption("Pokémon Battle Matchup Optimizer")
 
         self.state = state
@@ -70,6 +81,7 @@ class Game:
         # Game state
         self.enemy_team = enemy_team if enemy_team else [""] * 6
         self.user_team = user_team if user_team else [""] * 6
+        self.substitutes = {}
         self.running = running
         self.input_index = input_index
         self.error_message = error_message
@@ -81,6 +93,11 @@ class Game:
         self.random_button = random_button
         self.back_button = back_button
 
+        # Recommendation state
+        self.context = context if context else load_context()
+        self.recommender = recommender if recommender else self.context.session()
+        self.team_generator = team_generator if team_generator else TeamGenerator(self.context.pokedex)
+
     def load_sprite(self, pokemon_name: str) -> Optional[pygame.Surface]:
         """Tries to load a Pokémon sprite from the web, handling variations in naming."""
         if pokemon_name in self.pokemon_sprites:
@@ -209,6 +226,10 @@ class Game:
 
         for i, name in enumerate(self.user_team):
             self.display_pokemon(name, user_team_positions[i])
+            if self.substitutes.get(name):
+                x, y = user_team_positions[i]
+                substitute_text = SMALL_FONT.render("or " + ", ".join(self.substitutes[name]), True, BLACK)
+                self.screen.blit(substitute_text, (x - substitute_text.get_width() // 2, y + 45))
 
         self.back_button = self.draw_button("Back", WIDTH // 2.3, HEIGHT - 100, 120, 50)
 
@@ -236,7 +257,7 @@ class Game:
             elif self.state == INPUT_SCREEN and self.enter_button.collidepoint(mouse_position):
                 self.check_team()
             elif self.state == INPUT_SCREEN and self.random_button.collidepoint(mouse_position):
-                self.enemy_team = generate_random_team(pd.read_csv("pokemon_data.csv"))
+                self.enemy_team = generate_random_team(self.team_generator)
                 self.pokemon_sprites = {name: self.load_sprite(name) for name in self.enemy_team}
                 self.error_message = None
                 self.input_index = 0
@@ -244,6 +265,7 @@ class Game:
             elif self.state == RESULT_SCREEN and self.back_button.collidepoint(mouse_position):
                 self.enemy_team = [""] * 6
                 self.user_team = [""] * 6
+                self.substitutes = {}
                 self.pokemon_sprites.clear()
                 self.state = INPUT_SCREEN
         elif event.type == pygame.KEYDOWN and self.state == INPUT_SCREEN:
@@ -252,14 +274,17 @@ class Game:
     def check_team(self) -> None:
         """Checks if inputted enemy team is valid."""
         self.pokemon_sprites = {name: self.load_sprite(name) for name in set(self.enemy_team)}
-        invalid_names = [name for name in self.enemy_team if not self.pokemon_sprites.get(name)]
+        pokedex = self.context.pokedex
+        invalid_names = [name for name in self.enemy_team
+                         if not self.pokemon_sprites.get(name) or pokedex.convert_pokemon_to_id(name) is None]
 
         if invalid_names:
             self.error_message = "Invalid Pokémon names: " + ", ".join(invalid_names)
         else:
-            enemy_team_to_id = [convert_pokemon_to_id(pkmn, "pokemon_data.csv") for pkmn in self.enemy_team]
-            self.user_team, _ = get_user_pokemon(get_pokemon(enemy_team_to_id, "pokemon_data.csv"),
-                                                 "pokemon_data.csv", "chart.csv")
+            enemy_team_to_id = [pokedex.convert_pokemon_to_id(pkmn) for pkmn in self.enemy_team]
+            enemy_team = pokedex.get_pokemon(enemy_team_to_id)
+            self.user_team, _ = get_user_pokemon(enemy_team, session=self.recommender, context=self.context)
+            self.substitutes = get_substitutes(self.user_team, enemy_team, self.context.counter_index(), SUBSTITUTES)
             self.pokemon_sprites.update({name.lower(): self.load_sprite(name) for name in set(self.user_team)})
             self.state = RESULT_SCREEN
             self.error_message = None
@@ -294,9 +319,9 @@ class Game:
         pygame.quit()
 
 
-def generate_random_team(data: str) -> list[Pokemon]:
-    """Generates a random Pokémon team."""
-    return random.sample(data["Name"].tolist(), 6)
+def generate_random_team(generator: TeamGenerator) -> list[str]:
+    """Generates a random Pokémon team from the preloaded generator."""
+    return generator.team()
 
 
 if __name__ == "__main__":
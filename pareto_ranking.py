@@ -0,0 +1,171 @@
+"""multi-objective ranking of candidate pokemon against an enemy team
+
+Instead of folding everything into one weighted score, every pokemon of the pokedex gets four separate
+objectives against the enemy team:
+    - offense: the sum over the enemies of the best effectiveness of the pokemon's types (higher is better)
+    - defense: the sum over the enemies of the best effectiveness of the enemy's types against the pokemon
+      (lower is better)
+    - bst_distance: how far the pokemon's bst is outside ideal_bst_range of the enemy team (lower is better)
+    - speed: the pokemon's speed stat (higher is better)
+
+ParetoRanking scores the pokedex once per enemy team and can then return the non-dominated front, the full
+ranking into fronts, or a team picked for any weighting of the objectives without rescoring.
+"""
+from __future__ import annotations
+
+from operator import ge
+from typing import Any, Optional
+
+from graph_algorithm import graph_builder, get_effectiveness, get_defense_effectiveness
+from pokedex import Pokedex, row_to_pokemon
+from pokemon_class import Pokemon
+from pokemon_data_stream import row_bst
+from pokemon_final_team import get_types, ideal_bst_range
+
+OBJECTIVES = ('offense', 'defense', 'bst_distance', 'speed')
+# +1 for objectives to maximise, -1 for objectives to minimise
+DIRECTIONS = (1, -1, -1, 1)
+SPEED_INDEX = 9  # the speed column of a processed row
+
+
+def dominates(first: tuple, second: tuple) -> bool:
+    """return whether first is at least as good as second in every objective and differs from it
+
+    Both tuples are in maximising form, see ParetoRanking.maximising.
+    """
+    return first != second and all(a >= b for a, b in zip(first, second))
+
+
+def non_dominated_sort(points: list[tuple], max_fronts: Optional[int] = None) -> list[list[int]]:
+    """return the indices of points grouped into successive non-dominated fronts, at most max_fronts of them
+
+    Points are in maximising form. This is efficient non-dominated sort with binary search: identical points
+    are merged, the rest are visited in decreasing lexicographic order (so a point can only be dominated by
+    points already placed, and never by an equal one) and each goes to the first front with no point
+    dominating it. A point dominated by some point of a front is dominated by a point of every earlier front,
+    so that first front is found by binary search over the fronts. Points past max_fronts are dropped as soon
+    as they are placed, so asking only for the first fronts costs far less than ranking everything.
+    """
+    indices_by_point = {}
+    for index, point in enumerate(points):
+        indices_by_point.setdefault(point, []).append(index)
+
+    fronts = []
+    for point in sorted(indices_by_point, reverse=True):
+        low, high = 0, len(fronts)
+        while low < high:
+            middle = (low + high) // 2
+            # the latest points of a front are the closest lexicographically, so they are checked first
+            if any(all(map(ge, other, point)) for other in reversed(fronts[middle])):
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(fronts):
+            if max_fronts is not None and low >= max_fronts:
+                continue
+            fronts.append([])
+        fronts[low].append(point)
+
+    return [[index for point in front for index in indices_by_point[point]] for front in fronts]
+
+
+class ParetoRanking:
+    """
+    The objectives of every pokemon of a pokedex against one enemy team.
+
+    Instance Attributes:
+        - rows: the processed rows of the scored pokemon
+        - objectives: the (offense, defense, bst_distance, speed) of each row, in the same order
+        - bst_range: the ideal bst range of the enemy team
+    """
+    rows: list[list]
+    objectives: list[tuple]
+    bst_range: list[int]
+    _fronts: list[list[int]]
+    _complete: bool
+
+    def __init__(self, team: list[Pokemon], pokedex: Optional[Pokedex] = None, graph: Any = None) -> None:
+        pokedex = pokedex if pokedex is not None else Pokedex()
+        graph = graph if graph is not None else graph_builder('chart.csv')
+        enemy_types = get_types(team)
+        self.bst_range = ideal_bst_range(team)
+        self.rows = list(pokedex.rows)
+        self.objectives = []
+        self._fronts = []
+        self._complete = False
+
+        # offense and defense only depend on the typing, so each typing is scored once
+        typing_scores = {}
+        for row in self.rows:
+            typing = (row[2], row[3]) if row[3] else (row[2],)
+            if typing not in typing_scores:
+                typing_scores[typing] = (
+                    sum(max(get_effectiveness(graph, p_type, enemy) for p_type in typing) for enemy in enemy_types),
+                    sum(max(get_defense_effectiveness(graph, attack_type, typing)
+                            for attack_type in _attacking_types(enemy)) for enemy in enemy_types))
+            bst = row_bst(row)
+            bst_distance = max(self.bst_range[0] - bst, bst - self.bst_range[1], 0)
+            self.objectives.append(typing_scores[typing] + (bst_distance, row[SPEED_INDEX]))
+
+    def maximising(self, index: int) -> tuple:
+        """return the objectives of a row with every objective turned into one to maximise"""
+        return tuple(direction * value for direction, value in zip(DIRECTIONS, self.objectives[index]))
+
+    def fronts(self, count: Optional[int] = None) -> list[list[int]]:
+        """return the row indices grouped into the first count non-dominated fronts (all of them by default)"""
+        if not self._complete and (count is None or count > len(self._fronts)):
+            self._fronts = non_dominated_sort([self.maximising(index) for index in range(len(self.rows))], count)
+            self._complete = count is None or len(self._fronts) < count
+        return self._fronts if count is None else self._fronts[:count]
+
+    def front(self) -> list[dict[str, Any]]:
+        """return the name and objectives of every pokemon on the Pareto front"""
+        return [self.describe(index) for index in self.fronts(1)[0]]
+
+    def describe(self, index: int) -> dict[str, Any]:
+        """return the name and objectives of a row"""
+        return {'name': self.rows[index][1], **dict(zip(OBJECTIVES, self.objectives[index]))}
+
+    def pick_team(self, weights: dict[str, float], team_size: int = 6) -> list[Pokemon]:
+        """pick team_size pokemon by a weighted sum of the normalised objectives, searching the fronts in order
+
+        Whole fronts are taken best first, and the last front needed is ordered by the weighted sum, so the team
+        never holds a pokemon dominated by one left out.
+        """
+        lows = [min(values) for values in zip(*self.objectives)]
+        highs = [max(values) for values in zip(*self.objectives)]
+
+        def weighted(index: int) -> float:
+            total = 0.0
+            for position, name in enumerate(OBJECTIVES):
+                spread = highs[position] - lows[position]
+                if spread:
+                    normalised = (self.objectives[index][position] - lows[position]) / spread
+                    total += weights.get(name, 0.0) * DIRECTIONS[position] * normalised
+            return total
+
+        count = 1
+        while sum(len(front) for front in self.fronts(count)) < team_size and not self._complete:
+            count *= 2
+        picked = []
+        for front in self.fronts(count):
+            picked.extend(sorted(front, key=weighted, reverse=True))
+            if len(picked) >= team_size:
+                break
+        return [row_to_pokemon(self.rows[index]) for index in picked[:team_size]]
+
+
+def _attacking_types(enemy: Any) -> tuple:
+    """return the attacking types of an enemy typing"""
+    return enemy if isinstance(enemy, tuple) else (enemy,)
+
+
+if __name__ == '__main__':
+    from pokemon_final_team import get_pokemon
+
+    ranking = ParetoRanking(get_pokemon([54, 60, 114, 116, 984, 90], 'pokemon_data.csv'))
+    print(len(ranking.front()), "pokemon on the Pareto front")
+    for pokemon in ranking.front()[:10]:
+        print(pokemon)
+    print("offense first:", [p.name for p in ranking.pick_team({'offense': 1.0, 'defense': 0.3})])
+    print("speed first:", [p.name for p in ranking.pick_team({'speed': 1.0, 'bst_distance': 0.5})])
@@ -0,0 +1,102 @@
+"""in-memory pokedex loaded once from the pokemon data file
+
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from pokemon_class import Pokemon
+from pokemon_data_stream import iter_pokemon_rows
+
+# the type a primary type missing from a chart was before it was introduced
+TYPE_FALLBACKS = {'Fairy': 'Normal'}
+
+
+class Pokedex:
+    """
+    Every Pokemon of a data file, parsed once and indexed for lookups.
+
+    Instance Attributes:
+        - file_path: the data file the pokedex was loaded from
+        - rows: the processed rows of the data file, in file order (see pokemon_data_stream.process_row)
+        - by_id: a dictionary mapping pokemon ids to their Pokemon
+        - by_name: a dictionary mapping lowercase pokemon names to their Pokemon
+    """
+    file_path: str
+    rows: list[list]
+    by_id: dict[int, Pokemon]
+    by_name: dict[str, Pokemon]
+    _pokemon: list[Pokemon]
+
+    def __init__(self, file_path: str = 'pokemon_data.csv', rows: Optional[list[list]] = None,
+                 pokemon: Optional[list[Pokemon]] = None) -> None:
+        self.file_path = file_path
+        if rows is None:
+            rows = list(iter_pokemon_rows(file_path))
+        self.rows = rows
+        # the Pokemon of each row, given when they are shared with another pokedex
+        self._pokemon = pokemon if pokemon is not None else [row_to_pokemon(row) for row in rows]
+        self.by_id = {}
+        self.by_name = {}
+        for poke in self._pokemon:
+            # the first row wins, like the file based lookups
+            self.by_id.setdefault(poke.pokemon_id, poke)
+            self.by_name.setdefault(poke.name.lower(), poke)
+
+    def get_pokemon(self, team: list[int]) -> list[Pokemon]:
+        """get pokemon based on pokemon numbers, skipping unknown numbers"""
+        return [self.by_id[poke] for poke in team if poke in self.by_id]
+
+    def convert_pokemon_to_id(self, pokemon_name: str) -> Optional[int]:
+        """Convert a pokemon name to its id"""
+        pokemon = self.by_name.get(pokemon_name.lower())
+        return pokemon.pokemon_id if pokemon else None
+
+    def retyped(self, types: set[str]) -> Pokedex:
+        """return the pokedex with every pokemon given the typing it had under a chart of the given types (see
+        chart_typing), sharing the rows and Pokemon whose typing is unchanged"""
+        rows, pokemon = [], []
+        for row, poke in zip(self.rows, self._pokemon):
+            type1, type2 = chart_typing(row[2], row[3], types)
+            if (type1, type2) != (row[2], row[3]):
+                row = row[:2] + [type1, type2] + row[4:]
+                poke = row_to_pokemon(row)
+            rows.append(row)
+            pokemon.append(poke)
+        if all(row is old_row for row, old_row in zip(rows, self.rows)):
+            return self
+        return Pokedex(self.file_path, rows, pokemon)
+
+
+def chart_typing(type1: str, type2: str, types: set[str]) -> tuple[str, str]:
+    """return the typing of a pokemon (type2 is '' for a single type) under a chart of the given types
+
+    Types newer than the chart were added to existing pokemon: a primary type with a TYPE_FALLBACKS entry is
+    replaced by it (Clefairy and Togetic were Normal before Fairy), any other missing type is dropped (Magnemite
+    was pure Electric before Steel), and a pokemon left without a type is Normal.
+    """
+    typing = []
+    if type1 in types:
+        typing.append(type1)
+    elif type1 in TYPE_FALLBACKS:
+        typing.append(TYPE_FALLBACKS[type1])
+    if type2 and type2 in types and type2 not in typing:
+        typing.append(type2)
+    if not typing:
+        typing.append('Normal')
+    return typing[0], typing[1] if len(typing) > 1 else ''
+
+
+def row_to_pokemon(row: list) -> Pokemon:
+    """build a Pokemon from a processed row the same way pokemon_final_team.get_pokemon does"""
+    return Pokemon(
+        pokemon_id=row[0],
+        name=row[1],
+        type1=row[2],
+        type2=row[3] if row[3] else None,
+        attack=row[4],
+        defense=row[5],
+        spec_attack=row[6],
+        spec_defense=row[7],
+        speed=row[8]
+    )
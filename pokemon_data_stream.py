@@ -0,0 +1,76 @@
+"""chunked streaming reader for pokemon data files
+
+"""
+from __future__ import annotations
+
+import csv
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+DEFAULT_BATCH_SIZE = 4096
+
+
+def process_row(row: list[str]) -> list:
+    """Convert a row of pokemon data to a list with more appropriate data types."""
+    return [int(row[0]),
+            row[1],
+            row[2],
+            row[3],
+            int(row[4]),
+            int(row[5]),
+            int(row[6]),
+            int(row[7]),
+            int(row[8]),
+            int(row[9])]
+
+
+def row_bst(row: list) -> int:
+    """return the bst of a raw or processed row, summed over the same stats as Pokemon.bst"""
+    return sum(int(stat) for stat in row[4:9])
+
+
+def row_matches(row: list[str], types: Optional[set[str]] = None, bst_range: Optional[list[int]] = None,
+                ids: Optional[set[int]] = None, where: Optional[Callable[[list[str]], bool]] = None) -> bool:
+    """return whether a raw row passes every given predicate
+
+    The cheapest checks run first so most rows are rejected before any stat is parsed.
+    """
+    if types is not None and row[2] not in types and row[3] not in types:
+        return False
+    if ids is not None and int(row[0]) not in ids:
+        return False
+    if bst_range is not None and not bst_range[0] <= row_bst(row) <= bst_range[1]:
+        return False
+    return where is None or where(row)
+
+
+def iter_pokemon_batches(filename: str, batch_size: int = DEFAULT_BATCH_SIZE, types: Optional[Iterable[str]] = None,
+                         bst_range: Optional[list[int]] = None, ids: Optional[Iterable[int]] = None,
+                         where: Optional[Callable[[list[str]], bool]] = None) -> Iterator[list[list]]:
+    """Yield the processed rows of a pokemon data file in batches of at most batch_size rows.
+
+    Only batch_size raw rows are held at a time. Rows are filtered during the scan, before they are
+    converted, by:
+        - types: keep pokemon with at least one of these types
+        - bst_range: keep pokemon whose bst lies in [low, high]
+        - ids: keep pokemon with one of these ids
+        - where: keep raw rows for which this predicate is true
+    """
+    types = set(types) if types is not None else None
+    ids = set(ids) if ids is not None else None
+    with open(filename) as file:
+        reader = csv.reader(file)
+        next(reader)  # skip header row
+        while True:
+            chunk = list(islice(reader, batch_size))
+            if not chunk:
+                return
+            batch = [process_row(row) for row in chunk if row_matches(row, types, bst_range, ids, where)]
+            if batch:
+                yield batch
+
+
+def iter_pokemon_rows(filename: str, **filters) -> Iterator[list]:
+    """Yield the processed rows of a pokemon data file one at a time, see iter_pokemon_batches for the filters."""
+    for batch in iter_pokemon_batches(filename, **filters):
+        yield from batch
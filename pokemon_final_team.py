@@ -1,11 +1,14 @@
 """functions and helpers to get the final team
 
 """
-import csv
 import pokemon_data_scraper
 from pokemon_class import Pokemon
 from graph_algorithm import recommend_top_types
 from pokemon_data_scraper import convert_pokemon_to_id
+from recommender_session import RecommenderSession
+from pokedex import Pokedex, row_to_pokemon
+from counter_search import CounterIndex
+from pokemon_data_stream import iter_pokemon_rows
 
 
 def get_team_bst(team: Pokemon | list[Pokemon]):
@@ -34,26 +37,14 @@ def ideal_bst_range(team: Pokemon | list[Pokemon]):
 def get_pokemon(team: list[int], file_path='pokemon_data.csv'):
     """get pokemon based on pokemon numbers
     """
+    rows_by_id = {}
+    for row in pokemon_data_scraper.get_pokemon_data(team, file_path):
+        rows_by_id.setdefault(row[0], row)
+
     poke_list = []
-    # pokemon = Pokemon(0, '', Type('', {'':0.0}), Type('', {}), 0, 0, 0, 0, 0)
     for poke in team:
-        data = pokemon_data_scraper.get_pokemon_data([poke], file_path)
-
-        if not data or not data[0]:
-            continue
-
-        pokemon = Pokemon(
-            pokemon_id=data[0][0],
-            name=data[0][1],
-            type1=data[0][2],
-            type2=data[0][3] if data[0][3] else None,
-            attack=data[0][4],
-            defense=data[0][5],
-            spec_attack=data[0][6],
-            spec_defense=data[0][7],
-            speed=data[0][8]
-        )
-        poke_list.append(pokemon)
+        if poke in rows_by_id:
+            poke_list.append(row_to_pokemon(rows_by_id[poke]))
     return poke_list
 
 
@@ -79,32 +70,60 @@ def get_types(team: list[Pokemon]):
     return tuple(types)
 
 
-def convert_team_to_ints(team) -> list[int]:
+def convert_team_to_ints(team, file_path='pokemon_data.csv') -> list[int]:
     """return a list of pokemon id's for each pokemon in team
     """
     id_list = []
     for pkmn in team:
-        id_list.append(convert_pokemon_to_id(pkmn, "pokemon_data.csv"))
+        id_list.append(convert_pokemon_to_id(pkmn, file_path))
     return id_list
 
 
-def get_user_pokemon(team: list[Pokemon], file_pokemon='pokemon_data.csv', file_types='chart.csv'):
-    """get enemy pokemon based on bst and type"""
-    enemy_types = get_types(team)
-    top_types = recommend_top_types(enemy_types, file_types, len(team))
-    enemy_types = [item[0] for item in top_types]
-    enemy_bst_range = ideal_bst_range(team)
+def matching_pokemon_ids(rows, top_types) -> list[int]:
+    """return the ids of the pokemon rows whose typing matches one of the recommended types
+    """
+    recommended_types = [item[0] for item in top_types]
     possible_poke = []
+    for row in rows:
+        poke_types = (row[2], row[3]) if row[3] else row[2]
 
-    with open(file_pokemon, 'r') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            poke_types = (row[2], row[3]) if row[3] else row[2]
+        if poke_types in recommended_types or row[2] in recommended_types:
+            possible_poke.append(int(row[0]))
+    return possible_poke
+
+
+def get_user_pokemon(team: list[Pokemon], file_pokemon='pokemon_data.csv', file_types='chart.csv',
+                     session: RecommenderSession = None, pokedex: Pokedex = None, graph=None, store=None,
+                     context=None):
+    """get enemy pokemon based on bst and type
+
+    When a session is given, only the enemy slots that changed since its last call are rescored.
+    A preloaded pokedex and type graph can be given to skip reading file_pokemon and file_types, and a
+    store of precomputed recommendations is consulted before scoring the types.
+    An engine context (see engine_context.EngineContext) supplies the files, pokedex, graph and store instead.
+    """
+    if context is not None:
+        file_pokemon, file_types = context.file_pokemon, context.file_types
+        pokedex = pokedex if pokedex is not None else context.pokedex
+        graph = graph if graph is not None else context.graph
+        store = store if store is not None else context.store
 
-            if poke_types in [item[0] for item in top_types] or row[2] in enemy_types:
-                possible_poke.append(int(row[0]))
+    enemy_types = get_types(team)
+    if session is None:
+        top_types = recommend_top_types(enemy_types, file_types, len(team), graph=graph, store=store)
+    else:
+        session.set_team(list(enemy_types))
+        top_types = session.recommend(len(team))
+    enemy_bst_range = ideal_bst_range(team)
 
-    poke_data = get_pokemon(possible_poke, file_pokemon)
+    if pokedex is None:
+        recommended_types = {t for item in top_types for t in (item[0] if isinstance(item[0], tuple) else (item[0],))}
+        rows = iter_pokemon_rows(file_pokemon, types=recommended_types)
+        possible_poke = matching_pokemon_ids(rows, top_types)
+        poke_data = get_pokemon(possible_poke, file_pokemon)
+    else:
+        possible_poke = matching_pokemon_ids(pokedex.rows, top_types)
+        poke_data = pokedex.get_pokemon(possible_poke)
     po_data = filter_bst_team(poke_data, enemy_bst_range)
 
     if len(po_data) < 6:  # case where multiple of the same pokemon are inputted
@@ -113,8 +132,19 @@ def get_user_pokemon(team: list[Pokemon], file_pokemon='pokemon_data.csv', file_
         po_data.extend(additional_pokemon)
 
     pok_sorted = sorted(po_data, key=lambda x: x.bst, reverse=True)[:6]
+    user_team = [pokemon.name for pokemon in pok_sorted][:6]
+    return user_team, top_types
 
-    return [pokemon.name for pokemon in pok_sorted][:6], top_types
+
+def get_substitutes(user_team: list[str], team: list[Pokemon], counter_index: CounterIndex, count: int):
+    """map each pokemon of the user team to the names of up to count pokemon within the ideal bst range of the
+    enemy team whose matchups are closest to it
+
+    The counter index is built once by the caller (see counter_search.CounterIndex and
+    engine_context.EngineContext.counter_index) and reused between calls.
+    """
+    enemy_bst_range = ideal_bst_range(team)
+    return {name: counter_index.similar(name, count, enemy_bst_range, user_team) for name in user_team}
 
 
 if __name__ == '__main__':
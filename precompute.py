@@ -0,0 +1,282 @@
+"""offline precomputation of the candidate ranking of recommend_top_types for every enemy type composition
+
+The enemy types are the 18 single types and the 153 dual types of the chart. With teams of up to
+--max-team-size of them (in any order and with repeats) there are 171 compositions of size 1, 14,706 of
+size 2, 848,046 of size 3 and tens of millions beyond, so pick the size to match the time available.
+
+Run with `python precompute.py [--max-team-size 2] [--workers 4] [--shard-size 2000]`. Each shard of
+compositions is written to its own file in --shard-dir as soon as it is done, so an interrupted run picks up
+where it stopped. The shards are then merged into the lookup store at --store, which recommend_top_types
+consults through its store argument, and --check random enemy teams are checked against the live results.
+
+The ranking of the candidates only depends on the composition of the enemy team, so one ranking serves every
+order of it; the candidates are still matched to the enemies in the team's own order on lookup, so a store hit
+returns exactly what recommend_top_types computes without the store.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import combinations, combinations_with_replacement, islice
+from typing import Any, Callable, Iterator, Optional
+
+from graph_algorithm import graph_builder, rank_candidates, recommend_top_types
+
+# the version of the store layout, bumped when what is stored changes
+STORE_FORMAT = '3'
+
+# type graph preloaded once in each worker process by _init_worker
+_worker_graph = None
+
+
+def chart_hash(file_path: str) -> str:
+    """return a digest of the chart file, used to tell whether a store was built from it"""
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def canonical_enemy(enemy: Any) -> Any:
+    """return the enemy type with dual types in a fixed order"""
+    return tuple(sorted(enemy)) if isinstance(enemy, tuple) else enemy
+
+
+def encode_enemy(enemy: Any) -> str:
+    """return the key of a single enemy type, e.g. 'Fire' or 'Fighting/Ground'"""
+    return '/'.join(canonical_enemy(enemy)) if isinstance(enemy, tuple) else enemy
+
+
+def decode_enemy(key: str) -> Any:
+    """return the enemy type of a key made by encode_enemy"""
+    return tuple(key.split('/')) if '/' in key else key
+
+
+def composition_key(enemy_team: list) -> str:
+    """return the key of the enemy team's type composition, which ignores the order of the team"""
+    return '|'.join(sorted(encode_enemy(enemy) for enemy in enemy_team))
+
+
+def enemy_types(graph) -> list[Any]:
+    """return every single and dual enemy type of the graph"""
+    types = list(graph.vertices.keys())
+    return types + [canonical_enemy(pair) for pair in combinations(types, 2)]
+
+
+def iter_composition_keys(graph, max_team_size: int) -> Iterator[tuple[str, ...]]:
+    """yield the enemy keys of every composition of 1 to max_team_size enemies, in key order"""
+    keys = sorted(encode_enemy(enemy) for enemy in enemy_types(graph))
+    for team_size in range(1, max_team_size + 1):
+        yield from combinations_with_replacement(keys, team_size)
+
+
+def count_compositions(graph, max_team_size: int) -> int:
+    """return the number of compositions iter_composition_keys yields"""
+    n = len(enemy_types(graph))
+    total = 0
+    count = 1
+    for team_size in range(1, max_team_size + 1):
+        count = count * (n + team_size - 1) // team_size
+        total += count
+    return total
+
+
+def _init_worker(file_types: str) -> None:
+    """build the type graph once per worker process"""
+    global _worker_graph
+    _worker_graph = graph_builder(file_types)
+
+
+def _ranking(enemy_team: list) -> Optional[list]:
+    """return the stored form of the ranking of enemy_team: its best len(enemy_team) candidates and their scores
+
+    Returns None when there are fewer candidates than enemies, since recommend_top_types then recurses on the
+    enemies left over, which depends on the order of the team.
+    """
+    ranked = rank_candidates(_worker_graph, enemy_team)
+    if len(ranked) < len(enemy_team):
+        return None
+    return [[list(cand), score] for cand, score in ranked[:len(enemy_team)]]
+
+
+def _compute_shard(shard_path: str, keys_list: list[tuple[str, ...]]) -> str:
+    """compute the rankings of the compositions in keys_list and write them to shard_path atomically"""
+    shard = {}
+    for keys in keys_list:
+        enemy_team = [decode_enemy(key) for key in keys]
+        shard[composition_key(enemy_team)] = _ranking(enemy_team)
+    temp_path = shard_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(shard, file, separators=(',', ':'))
+    os.replace(temp_path, shard_path)
+    return shard_path
+
+
+def precompute_shards(shard_dir: str, file_types: str = 'chart.csv', max_team_size: int = 2, workers: int = 4,
+                      shard_size: int = 2000, progress: Optional[Callable[[int, int, int], None]] = None
+                      ) -> list[str]:
+    """compute the shards that are not already in shard_dir and return the paths of every shard
+
+    The compositions are enumerated once and each missing shard is handed its keys, with at most two shards per
+    worker waiting at a time. progress, if given, is called with the number of shards computed so far and the
+    number of shards to compute in this run, both leaving out the shards already in shard_dir, and the total
+    number of compositions: once before the first shard and once after each shard, so the last call has both
+    counts equal.
+    """
+    graph = graph_builder(file_types)
+    total = count_compositions(graph, max_team_size)
+    os.makedirs(shard_dir, exist_ok=True)
+    # shards from a different chart or team size would line up with different compositions
+    manifest = {'chart_hash': chart_hash(file_types), 'max_team_size': max_team_size, 'shard_size': shard_size,
+                'format': STORE_FORMAT}
+    manifest_path = os.path.join(shard_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            if json.load(file) != manifest:
+                raise ValueError(f'{shard_dir} holds shards of another chart or configuration')
+    else:
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file)
+
+    shard_paths = [os.path.join(shard_dir, f'shard-{index:06d}.json') for index in range(0, -(-total // shard_size))]
+    missing = {index for index, path in enumerate(shard_paths) if not os.path.exists(path)}
+    keys = iter_composition_keys(graph, max_team_size)
+    done = 0
+    if progress is not None:
+        progress(done, len(missing), total)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(file_types,)) as executor:
+        pending = set()
+        for index, shard_path in enumerate(shard_paths):
+            shard_keys = list(islice(keys, shard_size))
+            if index not in missing:
+                continue
+            pending.add(executor.submit(_compute_shard, shard_path, shard_keys))
+            # the last shards to compute are waited for below, whether or not they are the last shards overall
+            while len(pending) >= 2 * workers or (pending and len(pending) + done == len(missing)):
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(missing), total)
+    return shard_paths
+
+
+def build_store(shard_paths: list[str], store_path: str, file_types: str = 'chart.csv') -> None:
+    """merge the shards into a lookup store keyed by composition"""
+    temp_path = store_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    with connection:
+        connection.execute('CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)')
+        connection.execute('CREATE TABLE recommendations (composition TEXT PRIMARY KEY, types TEXT) WITHOUT ROWID')
+        connection.execute('INSERT INTO meta VALUES (?, ?)', ('chart_hash', chart_hash(file_types)))
+        connection.execute('INSERT INTO meta VALUES (?, ?)', ('format', STORE_FORMAT))
+        for shard_path in shard_paths:
+            with open(shard_path) as file:
+                shard = json.load(file)
+            connection.executemany('INSERT INTO recommendations VALUES (?, ?)',
+                                   ((key, json.dumps(ranking, separators=(',', ':')))
+                                    for key, ranking in shard.items() if ranking is not None))
+    connection.execute('VACUUM')
+    connection.close()
+    os.replace(temp_path, store_path)
+
+
+class PrecomputedStore:
+    """
+    A read-only lookup store of precomputed candidate rankings, built by this module.
+
+    Instance Attributes:
+        - path: the path of the store file
+        - chart_hash: the digest of the chart the rankings were computed with
+        - format: the STORE_FORMAT the store was built with
+    """
+    path: str
+    chart_hash: str
+    format: Optional[str]
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # the store is only read, so it can be shared by the threads of a server
+        self._connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        meta = dict(self._connection.execute('SELECT name, value FROM meta'))
+        self.chart_hash = meta['chart_hash']
+        self.format = meta.get('format')
+
+    def ranked(self, enemy_team: list) -> Optional[list[tuple]]:
+        """return the best len(enemy_team) candidates of graph_algorithm.rank_candidates for enemy_team, or None if
+        its composition is not covered"""
+        key = composition_key(enemy_team)
+        row = self._connection.execute('SELECT types FROM recommendations WHERE composition = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return [(tuple(cand), score) for cand, score in json.loads(row[0])]
+
+    def close(self) -> None:
+        """close the store file"""
+        self._connection.close()
+
+
+def load_store(store_path: str = 'recommendations.db', file_types: str = 'chart.csv') -> Optional[PrecomputedStore]:
+    """return the store at store_path, or None if it is missing, outdated or was built from a different chart"""
+    if not os.path.exists(store_path):
+        return None
+    store = PrecomputedStore(store_path)
+    if store.chart_hash != chart_hash(file_types) or store.format != STORE_FORMAT:
+        store.close()
+        return None
+    return store
+
+
+def check_store(store: PrecomputedStore, graph, max_team_size: int, samples: int = 1000,
+                seed: Any = None) -> list[list]:
+    """return the random enemy teams, out of samples of up to max_team_size enemies, for which a store hit differs
+    from the live recommend_top_types result
+
+    Teams come in random order with dual types in random order, to cover the lookups that share a composition.
+    """
+    rng = random.Random(seed)
+    enemies = enemy_types(graph)
+    mismatches = []
+    for _ in range(samples):
+        enemy_team = [tuple(rng.sample(enemy, 2)) if isinstance(enemy, tuple) else enemy
+                      for enemy in rng.choices(enemies, k=rng.randint(1, max_team_size))]
+        if recommend_top_types(enemy_team, graph=graph, store=store) != recommend_top_types(enemy_team, graph=graph):
+            mismatches.append(enemy_team)
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chart', default='chart.csv')
+    parser.add_argument('--max-team-size', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shard-size', type=int, default=2000)
+    parser.add_argument('--shard-dir', default='recommendation_shards')
+    parser.add_argument('--store', default='recommendations.db')
+    parser.add_argument('--check', type=int, default=1000)
+    args = parser.parse_args()
+
+    def print_progress(done: int, to_compute: int, total: int) -> None:
+        """print how many of the shards to compute in this run are done"""
+        if done == 0:
+            print(f"{total} compositions, {to_compute} shards left to compute")
+        print(f"\r{done}/{to_compute} shards", end='\n' if done == to_compute else '', flush=True)
+
+    paths = precompute_shards(args.shard_dir, args.chart, args.max_team_size, args.workers, args.shard_size,
+                              print_progress)
+    build_store(paths, args.store, args.chart)
+    print("wrote", args.store)
+    built_store = load_store(args.store, args.chart)
+    wrong = check_store(built_store, graph_builder(args.chart), args.max_team_size, args.check)
+    print(f"{args.check - len(wrong)}/{args.check} random teams match the live recommendations")
+    if wrong:
+        print("first mismatch:", wrong[0])
+        raise SystemExit(1)
@@ -0,0 +1,495 @@
+"""local HTTP service for team recommendations, name lookups and type matchups
+
+Run with `python recommendation_server.py [--port 8080] [--workers 4] [--queue-size 64] [--store recommendations.db]
+[--engine store] [--shadow-rate 0]`.
+The store of precomputed recommendations (see precompute.py) is used when it exists and matches the chart.
+Without --shared-memory, the server and every worker reload the data files when they change (see
+data_registry.py). With --shared-memory the data files are parsed once and the workers attach to them in
+shared memory (see shared_data.py) instead of each loading their own copy, without reloading.
+
+Endpoints:
+    - GET /pokemon?name=<name>: the id, types and bst of a Pokemon
+    - GET /matchup?attacker=<type>&defender=<type>[,<type>]: the effectiveness of one type against another
+    - POST /recommend with a body like {"team": ["Pikachu", ...]}: the recommended user team and type matchups.
+      With "substitutes": n in the body (up to MAX_SUBSTITUTES), the n pokemon closest to each recommended one
+      (see counter_search.py) are returned as well
+    - GET /shadow: the outcomes and latencies of the shadow comparisons, when --shadow-rate is above 0
+
+Recommendations are served by --engine: store (the precomputed store, falling back to the reference engine)
+or session (a RecommenderSession per worker). With --shadow-rate, that fraction of recommendations is also
+compared with the reference engine (see shadow_mode.py). The comparison runs as a separate worker job after the
+response is sent, one at a time, on the data files the request was served from, and times both engines the
+same way. It is disabled when the store engine has no matching store to check.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+from urllib.parse import urlsplit, parse_qs
+
+from counter_search import CounterIndex
+from graph_algorithm import get_effectiveness
+from data_registry import DataRegistry, CHART, POKEDEX
+from pokemon_final_team import get_substitutes
+from precompute import load_store
+from shared_data import SharedData, SharedDataHandle
+from shadow_mode import Engine, ShadowReport, reference_engine, session_engine, store_engine, shadow_compare
+
+MAX_BODY_SIZE = 64 * 1024
+MAX_LINE_SIZE = 8 * 1024
+MAX_HEADERS = 100
+MAX_SUBSTITUTES = 10
+ENGINES = ('store', 'session')
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+               503: 'Service Unavailable'}
+
+# data loaded once in each worker process by _init_worker or _init_shared_worker
+_worker_registry = None
+_worker_pokedex = None
+_worker_graph = None
+_worker_store = None
+_worker_shared = None
+_worker_counter_index = None
+_worker_engine = None
+_worker_reference = None
+
+
+class HTTPError(Exception):
+    """An error to report to the client with the given status code."""
+    status: int
+    message: str
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def make_engine(name: str, pokedex: Any, graph: Any, store: Any, file_types: str) -> Engine:
+    """return the engine of ENGINES with the given name, serving recommendations from the given data"""
+    if name == 'session':
+        return session_engine(pokedex, graph, file_types)
+    return store_engine(pokedex, graph, store)
+
+
+def make_registry(file_pokemon: str, file_types: str, store_path: str, engine: str = 'store') -> DataRegistry:
+    """return a started data registry whose snapshots also hold the precomputed store matching the chart, the
+    serving and reference engines, and the counter index of the pokedex, built on first use"""
+    registry = DataRegistry(file_pokemon, file_types)
+    registry.register('store', lambda snapshot: load_store(store_path, snapshot.file_types), (CHART,), eager=True,
+                      close=lambda store: store.close() if store is not None else None)
+    registry.register('engine', lambda snapshot: make_engine(engine, snapshot.pokedex, snapshot.graph,
+                                                             snapshot.derived('store'), snapshot.file_types))
+    registry.register('reference', lambda snapshot: reference_engine(snapshot.pokedex, snapshot.graph))
+    registry.register('counter_index', lambda snapshot: CounterIndex(snapshot.pokedex, snapshot.graph),
+                      (CHART, POKEDEX))
+    registry.start()
+    return registry
+
+
+def _init_worker(file_pokemon: str, file_types: str, store_path: str, engine: str) -> None:
+    """load the pokedex, type graph and precomputed store once per worker process, reloading them on change"""
+    global _worker_registry
+    _worker_registry = make_registry(file_pokemon, file_types, store_path, engine)
+
+
+def _init_shared_worker(handle: SharedDataHandle, file_types: str, store_path: str, engine: str) -> None:
+    """attach to the shared pokedex and chart, and load the precomputed store, once per worker process"""
+    global _worker_pokedex, _worker_graph, _worker_store, _worker_shared, _worker_engine, _worker_reference
+    _worker_shared = SharedData.attach(handle)
+    _worker_pokedex = _worker_shared.pokedex
+    _worker_graph = _worker_shared.graph()
+    _worker_store = load_store(store_path, file_types)
+    _worker_engine = make_engine(engine, _worker_pokedex, _worker_graph, _worker_store, file_types)
+    _worker_reference = reference_engine(_worker_pokedex, _worker_graph)
+
+
+def _worker_engines() -> tuple[Any, Engine, Engine, Any, Any]:
+    """return the pokedex, the serving engine, the reference engine, the precomputed store and the data version of
+    the worker process, from one consistent snapshot
+
+    The data version is the signatures of the data files, which are the same in every worker that loaded the same
+    files, or None in shared memory mode, where the data is never reloaded.
+    """
+    if _worker_registry is not None:
+        snapshot = _worker_registry.snapshot()
+        return (snapshot.pokedex, snapshot.derived('engine'), snapshot.derived('reference'),
+                snapshot.derived('store'), tuple(sorted(snapshot.signatures.items())))
+    return _worker_pokedex, _worker_engine, _worker_reference, _worker_store, None
+
+
+def _worker_counter() -> CounterIndex:
+    """return the counter index of the worker process, building it on first use"""
+    global _worker_counter_index
+    if _worker_registry is not None:
+        return _worker_registry.snapshot().derived('counter_index')
+    if _worker_counter_index is None:
+        _worker_counter_index = CounterIndex(_worker_pokedex, _worker_graph)
+    return _worker_counter_index
+
+
+def _recommend(names: list[str], versioned: bool = False, substitutes: int = 0) -> dict[str, Any]:
+    """compute the recommendation for the enemy team with the given names inside a worker process
+
+    Returns {'unknown': name} if a name is not in the pokedex. When versioned is true, the data version the
+    recommendation was computed from is returned under 'data_version'. When substitutes is above 0, that many
+    substitutes for each recommended pokemon are returned under 'substitutes'.
+    """
+    pokedex, engine, _, _, data_version = _worker_engines()
+    pokemon_ids = []
+    for name in names:
+        pokemon_id = pokedex.convert_pokemon_to_id(name)
+        if pokemon_id is None:
+            return {'unknown': name}
+        pokemon_ids.append(pokemon_id)
+    team = pokedex.get_pokemon(pokemon_ids)
+    user_team, matchups = engine.run(team)
+    result = {'user_team': user_team, 'matchups': matchups}
+    if versioned:
+        result['data_version'] = data_version
+    if substitutes > 0:
+        result['substitutes'] = get_substitutes(user_team, team, _worker_counter(), substitutes)
+    return result
+
+
+def _shadow(names: list[str], data_version: Any) -> Optional[dict[str, Any]]:
+    """compare the serving engine with the reference engine on an enemy team that was served and return the
+    comparison record
+
+    Both engines are run and timed the same way, on the enemy team already resolved. Returns None when the data
+    files changed since the team was served, or when the store engine has no store, since it then serves the
+    reference results.
+    """
+    pokedex, engine, reference, store, current_version = _worker_engines()
+    if current_version != data_version or (engine.name == 'store' and store is None):
+        return None
+    team = pokedex.get_pokemon([pokedex.convert_pokemon_to_id(name) for name in names])
+    return shadow_compare(team, reference, engine)
+
+
+class RecommendationServer:
+    """
+    An asyncio HTTP server answering lookups inline and running recommendations in a process pool.
+
+    Recommendation jobs wait in a bounded queue in front of the pool. When the queue is full, new
+    recommendation requests are rejected with 503 instead of piling up.
+
+    Instance Attributes:
+        - registry: the reloading data of the server process, or None in shared memory mode
+        - workers: the number of worker processes
+        - queue_size: the maximum number of recommendation jobs waiting for a worker
+        - engine: the name of the engine of ENGINES serving the recommendations
+        - shadow_rate: the fraction of recommendations compared with the reference engine
+        - shadow: the outcomes and latencies of those comparisons
+    """
+    registry: Optional[DataRegistry]
+    workers: int
+    queue_size: int
+    engine: str
+    shadow_rate: float
+    shadow: ShadowReport
+    _file_pokemon: str
+    _file_types: str
+    _store_path: str
+    _shared: Optional[SharedData]
+    _shared_graph: Any
+    _queue: Optional[asyncio.Queue]
+    _executor: Optional[ProcessPoolExecutor]
+    _dispatchers: list[asyncio.Task]
+    _shadow_pending: bool
+    _shadow_job: Optional[asyncio.Task]
+
+    def __init__(self, file_pokemon: str = 'pokemon_data.csv', file_types: str = 'chart.csv', workers: int = 4,
+                 queue_size: int = 64, store_path: str = 'recommendations.db', shared_memory: bool = False,
+                 shadow_rate: float = 0.0, engine: str = 'store') -> None:
+        if engine not in ENGINES:
+            raise ValueError(f'unknown engine {engine}, expected one of {", ".join(ENGINES)}')
+        if shared_memory:
+            self._shared = SharedData.create(file_pokemon, file_types)
+            self._shared_graph = self._shared.graph()
+            self.registry = None
+        else:
+            self._shared = None
+            self.registry = make_registry(file_pokemon, file_types, store_path, engine)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.engine = engine
+        self.shadow_rate = shadow_rate
+        if shadow_rate > 0 and engine == 'store':
+            store = load_store(store_path, file_types)
+            if store is None:
+                warnings.warn(f'no store matching the chart at {store_path}, shadow comparisons are disabled')
+                self.shadow_rate = 0.0
+            else:
+                store.close()
+        self.shadow = ShadowReport()
+        self._file_pokemon = file_pokemon
+        self._file_types = file_types
+        self._store_path = store_path
+        self._queue = None
+        self._executor = None
+        self._dispatchers = []
+        self._shadow_pending = False
+        self._shadow_job = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        """start the worker pool and the dispatchers, then listen on host and port"""
+        if self._shared is None:
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                 initargs=(self._file_pokemon, self._file_types, self._store_path,
+                                                           self.engine))
+        else:
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_init_shared_worker,
+                                                 initargs=(self._shared.handle, self._file_types, self._store_path,
+                                                           self.engine))
+        self._queue = asyncio.Queue(self.queue_size)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        return await asyncio.start_server(self._handle_connection, host, port, limit=MAX_LINE_SIZE)
+
+    def close(self) -> None:
+        """stop the dispatchers, shut down the worker pool and free the shared data"""
+        for task in self._dispatchers:
+            task.cancel()
+        if self._shadow_job is not None:
+            self._shadow_job.cancel()
+        if self.registry is not None:
+            self.registry.stop()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        if self._shared is not None:
+            self._shared.close()
+
+    def data(self) -> tuple[Any, Any]:
+        """return the pokedex and type graph to answer a request with, from one consistent snapshot"""
+        if self.registry is None:
+            return self._shared.pokedex, self._shared_graph
+        snapshot = self.registry.snapshot()
+        return snapshot.pokedex, snapshot.graph
+
+    async def _dispatch(self) -> None:
+        """hand queued recommendation jobs to the worker pool, one at a time per dispatcher"""
+        loop = asyncio.get_running_loop()
+        while True:
+            names, substitutes, future = await self._queue.get()
+            shadow = scheduled = False
+            try:
+                if not future.cancelled():
+                    # sample only while no comparison is pending, so they never take more than one worker
+                    shadow = self.shadow_rate > 0 and not self._shadow_pending and random.random() < self.shadow_rate
+                    self._shadow_pending = self._shadow_pending or shadow
+                    result = await loop.run_in_executor(self._executor, _recommend, names, shadow, substitutes)
+                    data_version = result.pop('data_version', None)
+                    if not future.cancelled():
+                        future.set_result(result)
+                    if shadow and 'unknown' not in result:
+                        self._shadow_job = asyncio.create_task(self._compare(names, data_version))
+                        scheduled = True
+            except Exception as error:  # report worker failures to the waiting request
+                if not future.done():
+                    future.set_exception(error)
+            finally:
+                if shadow and not scheduled:
+                    self._shadow_pending = False
+                self._queue.task_done()
+
+    async def _compare(self, names: list[str], data_version: Any) -> None:
+        """compare the serving engine with the reference engine on a served enemy team in a worker and record the
+        outcome"""
+        try:
+            comparison = await asyncio.get_running_loop().run_in_executor(self._executor, _shadow, names,
+                                                                          data_version)
+            if comparison is not None:
+                self.shadow.record(comparison)
+        except Exception as error:  # a failed comparison must not affect serving
+            warnings.warn(f'shadow comparison failed: {error}')
+        finally:
+            self._shadow_pending = False
+            self._shadow_job = None
+
+    async def recommend(self, names: list[str], substitutes: int = 0) -> dict[str, Any]:
+        """queue a recommendation for the enemy team with the given names and wait for its result, with that many
+        substitutes for each recommended pokemon"""
+        if not names:
+            raise HTTPError(400, 'team must contain at least one pokemon')
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((list(names), substitutes, future))
+        except asyncio.QueueFull:
+            raise HTTPError(503, 'too many pending recommendations, retry later') from None
+        result = await future
+        if 'unknown' in result:
+            raise HTTPError(404, f"unknown pokemon: {result['unknown']}")
+        return result
+
+    def lookup(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        """return the data of the Pokemon named in the query"""
+        pokedex, _ = self.data()
+        name = query.get('name', [''])[0]
+        pokemon_id = pokedex.convert_pokemon_to_id(name)
+        if pokemon_id is None:
+            raise HTTPError(404, f'unknown pokemon: {name}')
+        pokemon = pokedex.get_pokemon([pokemon_id])[0]
+        types = [pokemon.type1] if pokemon.type2 is None else [pokemon.type1, pokemon.type2]
+        return {'id': pokemon.pokemon_id, 'name': pokemon.name, 'types': types, 'bst': pokemon.bst}
+
+    def matchup(self, query: dict[str, list[str]]) -> dict[str, Any]:
+        """return the effectiveness of the attacking type against the defending type(s) in the query"""
+        _, graph = self.data()
+        attacker = query.get('attacker', [''])[0].capitalize()
+        defenders = [t.strip().capitalize() for t in query.get('defender', [''])[0].split(',') if t.strip()]
+        for p_type in [attacker] + defenders:
+            if p_type not in graph.vertices:
+                raise HTTPError(404, f'unknown type: {p_type}')
+        if not 1 <= len(defenders) <= 2:
+            raise HTTPError(400, 'defender must be one or two comma separated types')
+        defender = defenders[0] if len(defenders) == 1 else tuple(defenders)
+        return {'attacker': attacker, 'defender': defenders,
+                'effectiveness': get_effectiveness(graph, attacker, defender)}
+
+    async def _route(self, method: str, target: str, body: bytes) -> dict[str, Any]:
+        """return the response body for the request"""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == '/pokemon':
+            _require_method(method, 'GET')
+            return self.lookup(query)
+        elif url.path == '/matchup':
+            _require_method(method, 'GET')
+            return self.matchup(query)
+        elif url.path == '/recommend':
+            _require_method(method, 'POST')
+            try:
+                request = json.loads(body or b'{}')
+                team, substitutes = request.get('team'), request.get('substitutes', 0)
+            except (ValueError, AttributeError):
+                raise HTTPError(400, 'body must be a JSON object') from None
+            if not isinstance(team, list) or not all(isinstance(name, str) for name in team):
+                raise HTTPError(400, 'team must be a list of pokemon names')
+            if type(substitutes) is not int or not 0 <= substitutes <= MAX_SUBSTITUTES:
+                raise HTTPError(400, f'substitutes must be an integer from 0 to {MAX_SUBSTITUTES}')
+            return await self.recommend(team, substitutes)
+        elif url.path == '/shadow':
+            _require_method(method, 'GET')
+            return self.shadow.summary()
+        raise HTTPError(404, f'unknown path: {url.path}')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """serve the requests of one keep-alive connection"""
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request_line = await _read_line(reader, 400, 'request line too long')
+                    if not request_line:
+                        break
+                    try:
+                        method, target, version = request_line.decode('latin-1').split()
+                    except ValueError:
+                        raise HTTPError(400, 'malformed request line') from None
+                    headers = await _read_headers(reader)
+                except HTTPError as error:
+                    await _write_response(writer, error.status, {'error': error.message}, False)
+                    break
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+                try:
+                    length = int(headers.get('content-length', '0') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await _write_response(writer, 400, {'error': 'invalid Content-Length header'}, False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await _write_response(writer, 413, {'error': 'request body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload = 200, await self._route(method, target, body)
+                except HTTPError as error:
+                    status, payload = error.status, {'error': error.message}
+                except Exception as error:  # keep serving other requests
+                    status, payload = 500, {'error': str(error)}
+                await _write_response(writer, status, payload, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _require_method(method: str, expected: str) -> None:
+    """raise a 405 error if the request method is not the expected one"""
+    if method != expected:
+        raise HTTPError(405, f'use {expected}')
+
+
+async def _read_line(reader: asyncio.StreamReader, status: int, message: str) -> bytes:
+    """read one line of the request head, raising an HTTPError with status if it exceeds MAX_LINE_SIZE"""
+    try:
+        return await reader.readline()
+    except ValueError:  # the stream limit is MAX_LINE_SIZE
+        raise HTTPError(status, message) from None
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    """read at most MAX_HEADERS request headers up to the blank line, with lowercase names"""
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        line = await _read_line(reader, 431, 'request header too long')
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    raise HTTPError(431, f'more than {MAX_HEADERS} request headers')
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+    """write a JSON response"""
+    body = json.dumps(payload).encode()
+    head = (f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n')
+    if status == 503:
+        head += 'Retry-After: 1\r\n'
+    writer.write(head.encode('latin-1') + b'\r\n' + body)
+    await writer.drain()
+
+
+async def serve(host: str, port: int, workers: int, queue_size: int, store_path: str, shared: bool,
+                shadow_rate: float = 0.0, engine: str = 'store') -> None:
+    """run the recommendation server until cancelled"""
+    server = RecommendationServer(workers=workers, queue_size=queue_size, store_path=store_path,
+                                  shared_memory=shared, shadow_rate=shadow_rate, engine=engine)
+    listener = await server.start(host, port)
+    print(f"serving on http://{host}:{port} with {workers} workers")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--store', default='recommendations.db')
+    parser.add_argument('--shared-memory', action='store_true')
+    parser.add_argument('--shadow-rate', type=float, default=0.0)
+    parser.add_argument('--engine', choices=ENGINES, default='store')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue_size, args.store,
+                          args.shared_memory, args.shadow_rate, args.engine))
+    except KeyboardInterrupt:
+        pass
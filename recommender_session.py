@@ -0,0 +1,125 @@
+"""stateful recommender that re-scores the enemy team one slot at a time
+
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from graph_algorithm import graph_builder, enemy_strong_weak, dict_subtraction, score_enemy, chart_ordered_types, \
+    candidate_pairs, sort_candidates, match_ranked
+
+
+class RecommenderSession:
+    """
+    A recommender that keeps the per-enemy terms of recommend_top_types between calls.
+
+    Every score used by recommend_top_types is a sum of per-enemy terms, so replacing one slot of the enemy
+    team only subtracts the old enemy's terms and adds the new enemy's terms instead of rescoring the whole team.
+    Only the scoring is incremental. Replacing one enemy changes the score of most candidates, so recommend still
+    ranks the candidates from scratch, but only those made of the types left after dict_subtraction, which are
+    usually few.
+
+    Instance Attributes:
+        - file_path: the type chart the session was built from
+        - graph: the type graph built from file_path, unless an already built one was given
+        - team: the current enemy team, one entry per slot (None for an empty slot)
+        - strong: the strong tally of the whole team, as returned by strong_weak
+        - weak: the weak tally of the whole team, as returned by strong_weak
+        - scores: the score of every single and dual type candidate (a tuple of types in chart order) against
+          the whole team
+        - store: a store of precomputed recommendations consulted before ranking the candidates, if any
+    """
+    file_path: str
+    graph: Any
+    team: list[Any]
+    strong: dict[str, int]
+    weak: dict[str, int]
+    scores: dict[tuple, float]
+    store: Any
+    _slot_tallies: list[tuple[dict[str, int], dict[str, int]]]
+    _enemy_scores: dict[Any, dict[tuple, float]]
+
+    def __init__(self, team_size: int = 6, file_path: str = 'chart.csv', store: Any = None, graph: Any = None) -> None:
+        self.file_path = file_path
+        self.store = store
+        self.graph = graph if graph is not None else graph_builder(file_path)
+        self.team = [None] * team_size
+        self.strong = {}
+        self.weak = {}
+        candidates = candidate_pairs(list(self.graph.vertices.keys()))
+        self.scores = {cand: 0 for cand in candidates}
+        self._slot_tallies = [({}, {})] * team_size
+        self._enemy_scores = {}
+
+    def enemy_scores(self, enemy: Any) -> dict[tuple, float]:
+        """return the score_enemy term of every candidate against enemy, computing it once per enemy type"""
+        if enemy not in self._enemy_scores:
+            self._enemy_scores[enemy] = {cand: score_enemy(self.graph, cand, enemy) for cand in self.scores}
+        return self._enemy_scores[enemy]
+
+    def replace(self, slot: int, enemy: Any) -> None:
+        """replace the enemy in the given slot, updating the tallies and scores by the difference"""
+        old_enemy = self.team[slot]
+        if old_enemy == enemy:
+            return
+        if old_enemy is not None:
+            old_strong, old_weak = self._slot_tallies[slot]
+            _add_counts(self.strong, old_strong, -1)
+            _add_counts(self.weak, old_weak, -1)
+            for cand, term in self.enemy_scores(old_enemy).items():
+                self.scores[cand] -= term
+
+        if enemy is None:
+            self._slot_tallies[slot] = ({}, {})
+        else:
+            new_strong, new_weak = enemy_strong_weak(self.graph, enemy)
+            _add_counts(self.strong, new_strong, 1)
+            _add_counts(self.weak, new_weak, 1)
+            self._slot_tallies[slot] = (new_strong, new_weak)
+            for cand, term in self.enemy_scores(enemy).items():
+                self.scores[cand] += term
+        self.team[slot] = enemy
+
+    def set_team(self, enemy_team: list[Any]) -> None:
+        """update the session to enemy_team, only replacing the slots that changed"""
+        if len(enemy_team) != len(self.team):
+            self.resize(len(enemy_team))
+        for slot, enemy in enumerate(enemy_team):
+            self.replace(slot, enemy)
+
+    def resize(self, team_size: int) -> None:
+        """grow or shrink the team to team_size slots, emptying the dropped slots"""
+        for slot in range(team_size, len(self.team)):
+            self.replace(slot, None)
+        self.team = self.team[:team_size] + [None] * (team_size - len(self.team))
+        self._slot_tallies = self._slot_tallies[:team_size] + [({}, {})] * (team_size - len(self._slot_tallies))
+
+    def recommend(self, top_x: int = None) -> list[tuple]:
+        """return the same recommendations as recommend_top_types for the current team"""
+        enemy_team = [enemy for enemy in self.team if enemy is not None]
+        if top_x is None:
+            top_x = len(enemy_team)
+
+        sorted_candidates = None
+        if self.store is not None and top_x == len(enemy_team):
+            sorted_candidates = self.store.ranked(enemy_team)
+        if sorted_candidates is None:
+            types = chart_ordered_types(self.graph, dict_subtraction(self.strong, self.weak))
+            sorted_candidates = sort_candidates({cand: self.scores[cand] for cand in candidate_pairs(types)})
+        return match_ranked(self.graph, sorted_candidates, enemy_team, top_x, self.file_path)
+
+
+def _add_counts(total: dict[str, int], counts: dict[str, int], sign: int) -> None:
+    """add (or subtract, for a negative sign) counts into total, dropping tallies that reach zero"""
+    for key, count in counts.items():
+        total[key] = total.get(key, 0) + sign * count
+        if total[key] == 0:
+            del total[key]
+
+
+if __name__ == '__main__':
+    session = RecommenderSession()
+    session.set_team(['Water', 'Water', 'Grass', 'Water', ('Ground', 'Fighting'), 'Water'])
+    print("recommendations:", session.recommend())
+    session.replace(2, 'Fire')
+    print("after replacing slot 3:", session.recommend())
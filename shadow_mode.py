@@ -0,0 +1,270 @@
+"""shadow mode runs of an alternative recommendation engine against the reference engine
+
+The reference engine is get_user_pokemon scoring every enemy team from scratch with graph_algorithm. An
+alternative engine (a RecommenderSession, the precomputed store, or any faster rewrite) is run on the same
+enemy teams and its type recommendations and final teams are compared with the reference ones. The reference
+breaks ties between candidates in chart order, so the alternative must give the same recommendations in the
+same order and the same final team; anything else is a divergence. The latency of each engine is recorded
+alongside.
+
+ShadowRunner does this on a sampled fraction of live requests, and `python shadow_mode.py` runs the
+comparison offline over random enemy teams, exiting with status 1 if any recommendation diverged.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from graph_algorithm import graph_builder
+from pokedex import Pokedex, row_to_pokemon
+from pokemon_class import Pokemon
+from pokemon_final_team import get_user_pokemon
+from precompute import load_store
+from recommender_session import RecommenderSession
+from team_generator import TeamGenerator
+
+IDENTICAL = 'identical'
+DIVERGED = 'diverged'
+# the number of latencies kept per engine and of divergences kept for inspection
+LATENCY_WINDOW = 10_000
+DIVERGENCE_WINDOW = 100
+
+
+class Engine:
+    """
+    A named way of recommending a user team for an enemy team.
+
+    Instance Attributes:
+        - name: the name the engine is reported under
+        - run: a function from an enemy team to the user team names and the type matchups, as returned by
+          get_user_pokemon
+    """
+    name: str
+    run: Callable[[list[Pokemon]], tuple[list[str], list[tuple]]]
+
+    def __init__(self, name: str, run: Callable[[list[Pokemon]], tuple[list[str], list[tuple]]]) -> None:
+        self.name = name
+        self.run = run
+
+
+def reference_engine(pokedex: Pokedex, graph: Any) -> Engine:
+    """return the engine scoring every enemy team from scratch with graph_algorithm"""
+    return Engine('reference', lambda team: get_user_pokemon(team, pokedex=pokedex, graph=graph))
+
+
+def session_engine(pokedex: Pokedex, graph: Any, file_types: str = 'chart.csv') -> Engine:
+    """return the engine rescoring only the changed enemy slots with one RecommenderSession
+
+    The session is not thread safe, so calls are serialised.
+    """
+    session = RecommenderSession(file_path=file_types, graph=graph)
+    lock = threading.Lock()
+
+    def run(team: list[Pokemon]) -> tuple[list[str], list[tuple]]:
+        with lock:
+            return get_user_pokemon(team, pokedex=pokedex, graph=graph, session=session)
+    return Engine('session', run)
+
+
+def store_engine(pokedex: Pokedex, graph: Any, store: Any) -> Engine:
+    """return the engine looking enemy teams up in a store of precomputed recommendations first"""
+    return Engine('store', lambda team: get_user_pokemon(team, pokedex=pokedex, graph=graph, store=store))
+
+
+def normalise_matchups(matchups: list) -> list[tuple]:
+    """return the (recommended type, enemy) pairs with every typing as a string or a tuple"""
+    return [tuple(item if isinstance(item, str) else tuple(item) for item in pair) for pair in matchups]
+
+
+def compare_results(reference: tuple[list[str], list], alternative: tuple[list[str], list]) -> tuple[str, str]:
+    """return the outcome, IDENTICAL or DIVERGED, of the type recommendations and of the final teams of two engines
+
+    The reference engine ranks tied candidates in chart order, so any other recommendation is a divergence.
+    """
+    types = IDENTICAL if normalise_matchups(reference[1]) == normalise_matchups(alternative[1]) else DIVERGED
+    team = IDENTICAL if list(reference[0]) == list(alternative[0]) else DIVERGED
+    return types, team
+
+
+def _timed(engine: Engine, team: list[Pokemon]) -> tuple[tuple[list[str], list], float]:
+    """return the result of the engine on the team and the seconds it took"""
+    start = time.perf_counter()
+    result = engine.run(team)
+    return result, time.perf_counter() - start
+
+
+def shadow_compare(team: list[Pokemon], reference: Engine, alternative: Engine,
+                   results: Optional[dict[str, tuple]] = None) -> dict[str, Any]:
+    """run both engines on the enemy team and return the comparison record
+
+    results may already hold the (result, seconds) of an engine that served the request, keyed by engine name,
+    so it is not run twice.
+    """
+    results = dict(results or {})
+    for engine in (reference, alternative):
+        if engine.name not in results:
+            results[engine.name] = _timed(engine, team)
+    (reference_result, reference_seconds), (alternative_result, alternative_seconds) = \
+        results[reference.name], results[alternative.name]
+    types, final_team = compare_results(reference_result, alternative_result)
+    return {'enemy_team': [pokemon.name for pokemon in team], 'types': types, 'team': final_team,
+            'latency': {reference.name: reference_seconds, alternative.name: alternative_seconds},
+            reference.name: {'user_team': list(reference_result[0]),
+                             'matchups': normalise_matchups(reference_result[1])},
+            alternative.name: {'user_team': list(alternative_result[0]),
+                               'matchups': normalise_matchups(alternative_result[1])}}
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """return the nearest-rank percentile of already sorted values"""
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ShadowReport:
+    """
+    The outcomes and latencies of shadow comparisons, safe to update from several threads.
+
+    Instance Attributes:
+        - compared: the number of comparisons recorded
+        - type_outcomes: the number of comparisons of each type recommendation outcome
+        - team_outcomes: the number of comparisons of each final team outcome
+        - latencies: the latest LATENCY_WINDOW latencies of each engine, in seconds
+        - divergences: the latest DIVERGENCE_WINDOW comparison records that diverged
+    """
+    compared: int
+    type_outcomes: dict[str, int]
+    team_outcomes: dict[str, int]
+    latencies: dict[str, deque]
+    divergences: deque
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.compared = 0
+        self.type_outcomes = {IDENTICAL: 0, DIVERGED: 0}
+        self.team_outcomes = {IDENTICAL: 0, DIVERGED: 0}
+        self.latencies = {}
+        self.divergences = deque(maxlen=DIVERGENCE_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, comparison: dict[str, Any]) -> None:
+        """add a comparison record returned by shadow_compare"""
+        with self._lock:
+            self.compared += 1
+            self.type_outcomes[comparison['types']] += 1
+            self.team_outcomes[comparison['team']] += 1
+            for name, seconds in comparison['latency'].items():
+                self.latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+            if DIVERGED in (comparison['types'], comparison['team']):
+                self.divergences.append(comparison)
+
+    def diverged(self) -> bool:
+        """return whether any type recommendation or final team diverged"""
+        return self.type_outcomes[DIVERGED] > 0 or self.team_outcomes[DIVERGED] > 0
+
+    def summary(self) -> dict[str, Any]:
+        """return the outcome counts, the latency percentiles of each engine in milliseconds and the divergences"""
+        with self._lock:
+            latency = {}
+            for name, values in self.latencies.items():
+                ordered = sorted(values)
+                latency[name] = {'mean': sum(ordered) / len(ordered) * 1000,
+                                 **{f'p{percent}': _percentile(ordered, percent) * 1000 for percent in (50, 95, 99)}}
+            return {'compared': self.compared, 'types': dict(self.type_outcomes), 'team': dict(self.team_outcomes),
+                    'latency_ms': latency, 'divergences': list(self.divergences)}
+
+
+class ShadowRunner:
+    """
+    Answers requests with one engine while comparing it with the other on a sampled fraction of them.
+
+    Instance Attributes:
+        - reference: the reference engine
+        - alternative: the engine being checked against it
+        - sample_rate: the fraction of requests on which both engines are run
+        - serve_alternative: whether requests are answered with the alternative engine instead of the reference
+        - report: the outcomes and latencies of the comparisons so far
+    """
+    reference: Engine
+    alternative: Engine
+    sample_rate: float
+    serve_alternative: bool
+    report: ShadowReport
+    _rng: random.Random
+    _rng_lock: threading.Lock
+
+    def __init__(self, reference: Engine, alternative: Engine, sample_rate: float = 1.0,
+                 serve_alternative: bool = False, seed: Any = None) -> None:
+        self.reference = reference
+        self.alternative = alternative
+        self.sample_rate = sample_rate
+        self.serve_alternative = serve_alternative
+        self.report = ShadowReport()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        """return whether the next request should be compared"""
+        with self._rng_lock:
+            return self._rng.random() < self.sample_rate
+
+    def run(self, team: list[Pokemon]) -> tuple[list[str], list[tuple]]:
+        """return the served engine's user team and type matchups for the enemy team, comparing it if sampled"""
+        served = self.alternative if self.serve_alternative else self.reference
+        result, seconds = _timed(served, team)
+        if self.sampled():
+            self.report.record(shadow_compare(team, self.reference, self.alternative,
+                                              {served.name: (result, seconds)}))
+        return result
+
+
+def differential_test(alternative: Engine, teams: int = 1000, seed: Any = 0, team_size: int = 6,
+                      pokedex: Optional[Pokedex] = None, graph: Any = None) -> ShadowReport:
+    """compare the alternative engine with the reference engine on random enemy teams and return the report"""
+    pokedex = pokedex if pokedex is not None else Pokedex()
+    graph = graph if graph is not None else graph_builder('chart.csv')
+    reference = reference_engine(pokedex, graph)
+    generator = TeamGenerator(pokedex, seed, team_size)
+    report = ShadowReport()
+    for batch in generator.iter_batches(teams):
+        for indices in batch:
+            team = [row_to_pokemon(generator.rows[index]) for index in indices]
+            report.record(shadow_compare(team, reference, alternative))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', choices=['session', 'store'], default='session')
+    parser.add_argument('--teams', type=int, default=500)
+    parser.add_argument('--team-size', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--store', default='recommendations.db')
+    args = parser.parse_args()
+
+    shared_pokedex = Pokedex()
+    shared_graph = graph_builder('chart.csv')
+    if args.engine == 'session':
+        engine = session_engine(shared_pokedex, shared_graph)
+    else:
+        recommendation_store = load_store(args.store)
+        if recommendation_store is None:
+            sys.exit(f"no store matching the chart at {args.store}, build it with precompute.py")
+        engine = store_engine(shared_pokedex, shared_graph, recommendation_store)
+
+    differential_report = differential_test(engine, args.teams, args.seed, args.team_size, shared_pokedex,
+                                            shared_graph)
+    summary = differential_report.summary()
+    print(f"{summary['compared']} enemy teams compared")
+    print("type recommendations:", summary['types'])
+    print("final teams:", summary['team'])
+    for engine_name, percentiles in summary['latency_ms'].items():
+        print(f"{engine_name}: " + ", ".join(f"{key} {value:.2f}ms" for key, value in percentiles.items()))
+    for divergence in summary['divergences']:
+        print("diverged on", divergence['enemy_team'])
+    sys.exit(1 if differential_report.diverged() else 0)
@@ -0,0 +1,227 @@
+"""pokedex and type chart held once in shared memory for multi-process workers
+
+The parent process parses the data files once with SharedData.create and passes SharedData.handle to its
+workers (e.g. as a ProcessPoolExecutor initializer argument). Each worker calls SharedData.attach, which maps
+the same memory block as typed arrays without copying or parsing anything, so worker memory and start-up time
+stay the same whatever the size of the pokedex.
+"""
+from __future__ import annotations
+
+from array import array
+from multiprocessing import shared_memory
+from typing import Iterator, Optional
+
+from graph_algorithm import graph_from_chart
+from pokemon_class import Pokemon
+from pokemon_data_stream import iter_pokemon_batches
+from pokemon_type_data_scraper import read_effectiveness
+from pokedex import row_to_pokemon
+
+NO_TYPE = 255
+STAT_COUNT = 6
+
+# (section name, array typecode) of the memory block, in layout order
+SECTIONS = (('ids', 'i'), ('stats', 'h'), ('type1', 'B'), ('type2', 'B'), ('name_offsets', 'i'), ('names', 'B'),
+            ('id_order', 'i'), ('name_order', 'i'), ('chart', 'd'))
+
+
+class SharedDataHandle:
+    """
+    The picklable description of a SharedData memory block, passed to worker processes.
+
+    Instance Attributes:
+        - name: the name of the shared memory block
+        - types: the type names, in chart order
+        - sections: a dictionary mapping section names to their (start, length) in items
+    """
+    name: str
+    types: list[str]
+    sections: dict[str, tuple[int, int]]
+
+    def __init__(self, name: str, types: list[str], sections: dict[str, tuple[int, int]]) -> None:
+        self.name = name
+        self.types = types
+        self.sections = sections
+
+
+class SharedPokedex:
+    """
+    A read-only pokedex over the arrays of a SharedData block, with the lookups of pokedex.Pokedex.
+
+    Rows and Pokemon are built on demand from the arrays, so nothing is copied per process.
+
+    Instance Attributes:
+        - rows: the processed rows of the data file, in file order (see pokemon_data_stream.process_row)
+    """
+    rows: SharedRows
+    _data: SharedData
+
+    def __init__(self, data: SharedData) -> None:
+        self._data = data
+        self.rows = SharedRows(data)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _find(self, order: memoryview, target, key) -> Optional[int]:
+        """binary search the row index whose key equals target in a sorted order section"""
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if key(order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order) and key(order[low]) == target:
+            return order[low]
+        return None
+
+    def find_id(self, pokemon_id: int) -> Optional[int]:
+        """return the row index of the first pokemon with this id, or None"""
+        return self._find(self._data.sections['id_order'], pokemon_id, lambda index: self._data.sections['ids'][index])
+
+    def get_pokemon(self, team: list[int]) -> list[Pokemon]:
+        """get pokemon based on pokemon numbers, skipping unknown numbers"""
+        poke_list = []
+        for poke in team:
+            index = self.find_id(poke)
+            if index is not None:
+                poke_list.append(row_to_pokemon(self.rows[index]))
+        return poke_list
+
+    def convert_pokemon_to_id(self, pokemon_name: str) -> Optional[int]:
+        """Convert a pokemon name to its id"""
+        index = self._find(self._data.sections['name_order'], pokemon_name.lower(),
+                           lambda i: self._data.name(i).lower())
+        return self._data.sections['ids'][index] if index is not None else None
+
+
+class SharedRows:
+    """A read-only sequence of the processed rows of a SharedData block."""
+    _data: SharedData
+
+    def __init__(self, data: SharedData) -> None:
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._data.sections['ids'])
+
+    def __getitem__(self, index: int) -> list:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        sections = self._data.sections
+        types = self._data.types
+        type2 = sections['type2'][index]
+        stats = sections['stats'][index * STAT_COUNT:(index + 1) * STAT_COUNT].tolist()
+        return [sections['ids'][index], self._data.name(index), types[sections['type1'][index]],
+                types[type2] if type2 != NO_TYPE else ''] + stats
+
+    def __iter__(self) -> Iterator[list]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class SharedData:
+    """
+    A pokedex and type chart stored as typed arrays in one shared memory block.
+
+    Instance Attributes:
+        - handle: the description workers attach with
+        - types: the type names, in chart order
+        - sections: a dictionary mapping section names to typed memoryviews of the block
+        - pokedex: a read-only pokedex over the block
+    """
+    handle: SharedDataHandle
+    types: list[str]
+    sections: dict[str, memoryview]
+    pokedex: SharedPokedex
+    _memory: shared_memory.SharedMemory
+    _owner: bool
+
+    def __init__(self, memory: shared_memory.SharedMemory, handle: SharedDataHandle, owner: bool) -> None:
+        self._memory = memory
+        self._owner = owner
+        self.handle = handle
+        self.types = handle.types
+        self.sections = {}
+        for section, typecode in SECTIONS:
+            start, length = handle.sections[section]
+            size = array(typecode).itemsize
+            self.sections[section] = memory.buf[start * size:(start + length) * size].cast(typecode)
+        self.pokedex = SharedPokedex(self)
+
+    @staticmethod
+    def create(file_pokemon: str = 'pokemon_data.csv', file_types: str = 'chart.csv') -> SharedData:
+        """parse the data files once and copy them into a new shared memory block"""
+        types, effectiveness = read_effectiveness(file_types)
+        type_indices = {p_type: index for index, p_type in enumerate(types)}
+        columns = {section: array(typecode) for section, typecode in SECTIONS}
+        columns['name_offsets'].append(0)
+        lowercase_names = []
+
+        for batch in iter_pokemon_batches(file_pokemon):
+            for row in batch:
+                for p_type in (row[2], row[3]):
+                    if p_type and p_type not in type_indices:  # keep types missing from the chart usable
+                        type_indices[p_type] = len(types)
+                        types.append(p_type)
+                columns['ids'].append(row[0])
+                columns['stats'].extend(row[4:4 + STAT_COUNT])
+                columns['type1'].append(type_indices[row[2]])
+                columns['type2'].append(type_indices[row[3]] if row[3] else NO_TYPE)
+                columns['names'].frombytes(row[1].encode())
+                columns['name_offsets'].append(len(columns['names']))
+                lowercase_names.append(row[1].lower())
+
+        count = len(columns['ids'])
+        # stable sorts, so the first of several equal rows is found like in the file based lookups
+        columns['id_order'].extend(sorted(range(count), key=lambda index: columns['ids'][index]))
+        columns['name_order'].extend(sorted(range(count), key=lambda index: lowercase_names[index]))
+        columns['chart'].extend(value for row in effectiveness for value in row)
+
+        # every section starts on an 8 byte boundary so each typed view is aligned
+        layout = {}
+        offset = 0
+        for section, typecode in SECTIONS:
+            size = array(typecode).itemsize
+            offset = -(-offset // 8) * 8
+            layout[section] = (offset // size, len(columns[section]))
+            offset += len(columns[section]) * size
+        memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for section, typecode in SECTIONS:
+            start, length = layout[section]
+            size = array(typecode).itemsize
+            memory.buf[start * size:(start + length) * size] = columns[section].tobytes()
+        return SharedData(memory, SharedDataHandle(memory.name, types, layout), True)
+
+    @staticmethod
+    def attach(handle: SharedDataHandle) -> SharedData:
+        """map the block described by handle into this process without copying it"""
+        # workers of a pool share the parent's resource tracker, which unlinks the block if the parent dies
+        return SharedData(shared_memory.SharedMemory(name=handle.name), handle, False)
+
+    def name(self, index: int) -> str:
+        """return the name of the pokemon in the given row"""
+        offsets = self.sections['name_offsets']
+        return bytes(self.sections['names'][offsets[index]:offsets[index + 1]]).decode()
+
+    def effectiveness(self) -> list[list[float]]:
+        """return the chart as read_effectiveness does"""
+        chart = self.sections['chart']
+        width = int(len(chart) ** 0.5)
+        return [chart[row * width:(row + 1) * width].tolist() for row in range(width)]
+
+    def graph(self):
+        """return the type graph of the shared chart"""
+        width = int(len(self.sections['chart']) ** 0.5)
+        return graph_from_chart(self.types[:width], self.effectiveness())
+
+    def close(self) -> None:
+        """release this process' views, and free the block if this process created it"""
+        self.pokedex = None
+        for view in self.sections.values():
+            view.release()
+        self.sections = {}
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
@@ -0,0 +1,33 @@
+"""tests of the generation typing of engine context pokedexes
+
+Run with `python -m pytest test_engine_context.py`.
+"""
+from engine_context import load_context
+from pokedex import chart_typing
+from pokemon_final_team import get_user_pokemon
+
+
+def test_gen1_keeps_pokemon_of_newer_types() -> None:
+    """Magnemite and Clefairy resolve in generation 1, with the typing they had then"""
+    context = load_context('gen1', store_path=None)
+    pokedex = context.pokedex
+    magnemite = pokedex.get_pokemon([pokedex.convert_pokemon_to_id('Magnemite')])[0]
+    clefairy = pokedex.get_pokemon([pokedex.convert_pokemon_to_id('Clefairy')])[0]
+    assert (magnemite.type1, magnemite.type2) == ('Electric', None)
+    assert (clefairy.type1, clefairy.type2) == ('Normal', None)
+
+    user_team, matchups = get_user_pokemon([magnemite, clefairy], context=context)
+    assert user_team
+    assert [enemy for _, enemy in matchups] == ['Electric', 'Normal']
+
+
+def test_chart_typing() -> None:
+    """missing primary types fall back, missing secondary types are dropped, and no type left means Normal"""
+    gen1_types = {'Normal', 'Fire', 'Water', 'Electric', 'Grass', 'Ice', 'Fighting', 'Poison', 'Ground', 'Flying',
+                  'Psychic', 'Bug', 'Rock', 'Ghost', 'Dragon'}
+    assert chart_typing('Fairy', 'Flying', gen1_types) == ('Normal', 'Flying')
+    assert chart_typing('Normal', 'Fairy', gen1_types) == ('Normal', '')
+    assert chart_typing('Psychic', 'Fairy', gen1_types) == ('Psychic', '')
+    assert chart_typing('Steel', 'Ground', gen1_types) == ('Ground', '')
+    assert chart_typing('Steel', '', gen1_types) == ('Normal', '')
+    assert chart_typing('Water', 'Ice', gen1_types) == ('Water', 'Ice')